@@ -0,0 +1,155 @@
+import os
+import json
+import logging
+import threading
+import time
+from collections import namedtuple
+from api._lib.address_set import (
+    COMPILED_ROOTS_FILENAME, COMPILED_SET_FILENAME, MappedAddressSet, MappedFlaggedRoots, is_compiled_set_fresh
+)
+
+logger = logging.getLogger(__name__)
+
+# Minimum number of seconds between two checks of the source files on disk
+RELOAD_CHECK_INTERVAL = float(os.getenv('ADDRESS_INDEX_RELOAD_INTERVAL', '5'))
+
+
+# Flagged root entity an address belongs to and the list it was found in
+FlaggedEntity = namedtuple('FlaggedEntity', ['root', 'category'])
+
+MIXER_CATEGORY = 'mixer'
+SANCTIONS_CATEGORY = 'sanctions'
+
+
+# Function to flatten the nested mixer lists into normalized address -> root
+# entity. Roots are mixed-case keys in flagged.json and map to themselves.
+def build_flagged_parents(flagged_addresses):
+    flagged_parents = {root.lower(): root.lower() for root in flagged_addresses}
+    for root, nested_list in flagged_addresses.items():
+        for address in nested_list:
+            flagged_parents.setdefault(address.lower(), root.lower())
+    return flagged_parents
+
+
+# Immutable snapshot of the screening lists. Every reload builds a brand new
+# instance, so a request holding a reference never sees a partially built index.
+class AddressIndex:
+    def __init__(self, unique_addresses, flagged_addresses, signature):
+        # Either an in-memory frozenset or a MappedAddressSet over the compiled lists
+        if not isinstance(unique_addresses, MappedAddressSet):
+            unique_addresses = frozenset(unique_addresses)
+        self.unique_addresses = unique_addresses
+        # Either the parsed flagged.json or a MappedFlaggedRoots over its compiled
+        # table; the raw lists (flagged_addresses) are only kept in the first case
+        if isinstance(flagged_addresses, MappedFlaggedRoots):
+            self.flagged_addresses = None
+            self.flagged_parents = flagged_addresses
+        else:
+            self.flagged_addresses = flagged_addresses
+            self.flagged_parents = build_flagged_parents(flagged_addresses)
+        self.signature = signature
+
+    # Mixer lookup: a flagged root itself or any address nested under one
+    def find_flagged_root(self, address):
+        root = self.flagged_parents.get(address.lower())
+        if root is not None:
+            return FlaggedEntity(root, MIXER_CATEGORY)
+        return None
+
+    # Mixer lookup first, then the sanction lists
+    def lookup(self, address):
+        entity = self.find_flagged_root(address)
+        if entity is None and address.lower() in self.unique_addresses:
+            entity = FlaggedEntity(address.lower(), SANCTIONS_CATEGORY)
+        return entity
+
+
+# Function to fingerprint the .json lists (and their compiled binary set) so
+# changes can be detected with os.stat only
+def source_signature(unique_dir):
+    entries = []
+    if not os.path.isdir(unique_dir):
+        return tuple(entries)
+    for filename in sorted(os.listdir(unique_dir)):
+        if filename.endswith('.json') or filename in (COMPILED_SET_FILENAME, COMPILED_ROOTS_FILENAME):
+            stat = os.stat(os.path.join(unique_dir, filename))
+            entries.append((filename, stat.st_mtime_ns, stat.st_size))
+    return tuple(entries)
+
+
+# Function to parse every list once and build a new index snapshot
+def build_address_index(unique_dir, flagged_path, signature=None):
+    if signature is None:
+        signature = source_signature(unique_dir)
+
+    json_paths = [os.path.join(unique_dir, filename) for filename, _, _ in signature if filename.endswith('.json')]
+    compiled_path = os.path.join(unique_dir, COMPILED_SET_FILENAME)
+    roots_path = os.path.join(unique_dir, COMPILED_ROOTS_FILENAME)
+
+    # Prefer the compiled files when they are up to date; nothing is parsed then
+    if is_compiled_set_fresh(compiled_path, json_paths):
+        unique_addresses = MappedAddressSet(compiled_path)
+        flagged_addresses = {}
+        if os.path.exists(flagged_path) and is_compiled_set_fresh(roots_path, [flagged_path]):
+            flagged_addresses = MappedFlaggedRoots(roots_path)
+        elif os.path.exists(flagged_path):
+            with open(flagged_path, 'r') as f:
+                flagged_addresses = json.load(f)
+    else:
+        unique_addresses = set()
+        flagged_addresses = {}
+        for filepath in json_paths:
+            with open(filepath, 'r') as f:
+                data = json.load(f)
+            for address in data:
+                unique_addresses.add(address.lower())
+            if os.path.abspath(filepath) == os.path.abspath(flagged_path):
+                flagged_addresses = data
+
+    logger.debug(f"Built address index: {len(unique_addresses)} unique, {len(flagged_addresses)} flagged entries")
+    return AddressIndex(unique_addresses, flagged_addresses, signature)
+
+
+# Process-wide holder of the current AddressIndex. Readers never block: when a
+# reload is already running in another thread they keep using the previous snapshot.
+class AddressIndexLoader:
+    def __init__(self, unique_dir, flagged_path, check_interval=RELOAD_CHECK_INTERVAL):
+        self.unique_dir = unique_dir
+        self.flagged_path = flagged_path
+        self.check_interval = check_interval
+        self._index = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+
+    def get(self):
+        index = self._index
+        if index is not None and time.monotonic() < self._next_check:
+            return index
+
+        # Only the first cold start waits for the build, later reloads are done
+        # by whichever thread wins the lock while the others keep the old snapshot
+        if not self._lock.acquire(blocking=index is None):
+            return index
+        try:
+            if self._index is not None and time.monotonic() < self._next_check:
+                return self._index
+            self._reload()
+            return self._index
+        finally:
+            self._lock.release()
+
+    def _reload(self):
+        self._next_check = time.monotonic() + self.check_interval
+        current = self._index
+        try:
+            signature = source_signature(self.unique_dir)
+            if current is not None and signature == current.signature:
+                return
+            self._index = build_address_index(self.unique_dir, self.flagged_path, signature)
+            if current is not None:
+                logger.info("Address index reloaded after change on disk")
+        except (OSError, ValueError) as e:
+            # A list being rewritten can fail to parse, keep serving the last good index
+            logger.error(f"Error reloading address index: {e}")
+            if current is None:
+                self._index = AddressIndex(set(), {}, ())
@@ -0,0 +1,257 @@
+import os
+import sys
+import json
+import mmap
+import struct
+import bisect
+import logging
+import argparse
+
+logger = logging.getLogger(__name__)
+
+# File layout: header, optional Bloom filter bit array, then the sorted 20-byte addresses
+MAGIC = b'IDFADDR1'
+HEADER = struct.Struct('<8sQQII')
+ADDRESS_SIZE = 20
+COMPILED_SET_FILENAME = 'unique_addresses.bin'
+DEFAULT_BLOOM_BITS_PER_ADDRESS = 10
+
+# Mixer roots file layout: header, the root addresses, then sorted records of
+# a 20-byte address followed by the little-endian index of its root
+ROOTS_MAGIC = b'IDFROOT1'
+ROOTS_HEADER = struct.Struct('<8sQQ')
+ROOT_INDEX = struct.Struct('<I')
+ROOT_RECORD_SIZE = ADDRESS_SIZE + ROOT_INDEX.size
+COMPILED_ROOTS_FILENAME = 'flagged_roots.bin'
+FLAGGED_FILENAME = 'flagged.json'
+
+
+# Function to convert a 0x-prefixed hex address to its 20 raw bytes, None if malformed
+def address_to_bytes(address):
+    if not isinstance(address, str) or len(address) != 42 or not address[:2].lower() == '0x':
+        return None
+    try:
+        return bytes.fromhex(address[2:])
+    except ValueError:
+        return None
+
+
+# Addresses are already uniformly distributed hashes, so the Bloom probes are
+# derived from the address bytes themselves (double hashing) instead of rehashing
+def bloom_positions(raw, bloom_bits, bloom_hashes):
+    h1 = int.from_bytes(raw[:8], 'little')
+    h2 = int.from_bytes(raw[8:16], 'little') | 1
+    return [(h1 + i * h2) % bloom_bits for i in range(bloom_hashes)]
+
+
+# Function to write a compiled address set atomically (readers keep the old inode mapped)
+def write_address_set(addresses, output_path, bloom_bits_per_address=DEFAULT_BLOOM_BITS_PER_ADDRESS):
+    records = set()
+    skipped = 0
+    for address in addresses:
+        raw = address_to_bytes(address)
+        if raw is None:
+            skipped += 1
+            continue
+        records.add(raw)
+    records = sorted(records)
+    if skipped:
+        logger.warning(f"Skipped {skipped} malformed addresses while compiling {output_path}")
+
+    bloom_bits = 0
+    bloom_hashes = 0
+    bloom = b''
+    if bloom_bits_per_address and records:
+        bloom_bits = max(64, (len(records) * bloom_bits_per_address + 7) // 8 * 8)
+        bloom_hashes = max(1, round(bloom_bits_per_address * 0.693))
+        bloom_array = bytearray(bloom_bits // 8)
+        for raw in records:
+            for position in bloom_positions(raw, bloom_bits, bloom_hashes):
+                bloom_array[position >> 3] |= 1 << (position & 7)
+        bloom = bytes(bloom_array)
+
+    tmp_path = f"{output_path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, len(records), bloom_bits, bloom_hashes, 0))
+        f.write(bloom)
+        for raw in records:
+            f.write(raw)
+    os.replace(tmp_path, output_path)
+    return len(records)
+
+
+# Function to write the mixer lists (root -> nested addresses) as a sorted
+# address -> root table; every root maps to itself, and an address nested under
+# several roots keeps the first
+def write_flagged_roots(flagged_addresses, output_path):
+    roots = []
+    root_indexes = {}
+    parents = {}
+    for root in flagged_addresses:
+        raw_root = address_to_bytes(root)
+        if raw_root is None:
+            logger.warning(f"Skipped malformed mixer root {root!r} while compiling {output_path}")
+            continue
+        if raw_root not in root_indexes:
+            root_indexes[raw_root] = parents[raw_root] = len(roots)
+            roots.append(raw_root)
+    for root, nested_list in flagged_addresses.items():
+        raw_root = address_to_bytes(root)
+        if raw_root is None:
+            continue
+        for address in nested_list:
+            raw = address_to_bytes(address)
+            if raw is not None:
+                parents.setdefault(raw, root_indexes[raw_root])
+
+    tmp_path = f"{output_path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(ROOTS_HEADER.pack(ROOTS_MAGIC, len(parents), len(roots)))
+        for raw_root in roots:
+            f.write(raw_root)
+        for raw in sorted(parents):
+            f.write(raw + ROOT_INDEX.pack(parents[raw]))
+    os.replace(tmp_path, output_path)
+    return len(parents)
+
+
+# Function to compile every .json list in the unique/ directory into one binary
+# set, and the nested mixer lists of flagged.json into a roots table
+def compile_unique_dir(unique_dir, output_path=None, bloom_bits_per_address=DEFAULT_BLOOM_BITS_PER_ADDRESS,
+                       roots_output_path=None):
+    if output_path is None:
+        output_path = os.path.join(unique_dir, COMPILED_SET_FILENAME)
+    flagged_path = os.path.join(unique_dir, FLAGGED_FILENAME)
+    if os.path.exists(flagged_path):
+        with open(flagged_path, 'r') as f:
+            flagged_addresses = json.load(f)
+        count = write_flagged_roots(flagged_addresses, roots_output_path or os.path.join(unique_dir, COMPILED_ROOTS_FILENAME))
+        logger.info(f"Compiled {count} mixer addresses under {len(flagged_addresses)} roots")
+
+    def iter_addresses():
+        for filename in sorted(os.listdir(unique_dir)):
+            if filename.endswith('.json'):
+                with open(os.path.join(unique_dir, filename), 'r') as f:
+                    data = json.load(f)
+                for address in data:
+                    yield address
+
+    return write_address_set(iter_addresses(), output_path, bloom_bits_per_address)
+
+
+# Sequence view over the sorted records so bisect can search the mapping
+# directly; items are the 20-byte addresses at the start of each record
+class _Records:
+    def __init__(self, buffer, offset, count, record_size=ADDRESS_SIZE):
+        self._buffer = buffer
+        self._offset = offset
+        self._count = count
+        self._record_size = record_size
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, i):
+        start = self._offset + i * self._record_size
+        return self._buffer[start:start + ADDRESS_SIZE]
+
+
+# Read-only, memory-mapped address set. The pages live in the OS page cache and
+# are shared by every worker process that maps the same file.
+class MappedAddressSet:
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, count, bloom_bits, bloom_hashes, _ = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            self._mmap.close()
+            raise ValueError(f"Not a compiled address set: {path}")
+        expected_size = HEADER.size + bloom_bits // 8 + count * ADDRESS_SIZE
+        if len(self._mmap) != expected_size:
+            self._mmap.close()
+            raise ValueError(f"Truncated compiled address set: {path}")
+
+        self._bloom_bits = bloom_bits
+        self._bloom_hashes = bloom_hashes
+        self._bloom_offset = HEADER.size
+        self._records = _Records(self._mmap, HEADER.size + bloom_bits // 8, count)
+
+    def __len__(self):
+        return len(self._records)
+
+    def __contains__(self, address):
+        raw = address_to_bytes(address)
+        if raw is None:
+            return False
+        if self._bloom_bits:
+            for position in bloom_positions(raw, self._bloom_bits, self._bloom_hashes):
+                if not self._mmap[self._bloom_offset + (position >> 3)] & (1 << (position & 7)):
+                    return False
+        i = bisect.bisect_left(self._records, raw)
+        return i < len(self._records) and self._records[i] == raw
+
+    def __iter__(self):
+        for i in range(len(self._records)):
+            yield '0x' + self._records[i].hex()
+
+
+# Read-only, memory-mapped mixer table answering address -> lowercase root,
+# so flagged.json does not have to be parsed on a cold start
+class MappedFlaggedRoots:
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, count, root_count = ROOTS_HEADER.unpack_from(self._mmap, 0)
+        if magic != ROOTS_MAGIC:
+            self._mmap.close()
+            raise ValueError(f"Not a compiled mixer table: {path}")
+        self._roots_offset = ROOTS_HEADER.size
+        self._records_offset = self._roots_offset + root_count * ADDRESS_SIZE
+        if len(self._mmap) != self._records_offset + count * ROOT_RECORD_SIZE:
+            self._mmap.close()
+            raise ValueError(f"Truncated compiled mixer table: {path}")
+        self._records = _Records(self._mmap, self._records_offset, count, ROOT_RECORD_SIZE)
+
+    def __len__(self):
+        return len(self._records)
+
+    def _root(self, index):
+        start = self._roots_offset + index * ADDRESS_SIZE
+        return '0x' + self._mmap[start:start + ADDRESS_SIZE].hex()
+
+    # Same contract as dict.get on the in-memory address -> root mapping
+    def get(self, address, default=None):
+        raw = address_to_bytes(address)
+        if raw is None:
+            return default
+        i = bisect.bisect_left(self._records, raw)
+        if i >= len(self._records) or self._records[i] != raw:
+            return default
+        start = self._records_offset + i * ROOT_RECORD_SIZE + ADDRESS_SIZE
+        return self._root(ROOT_INDEX.unpack_from(self._mmap, start)[0])
+
+
+# Function to check whether a compiled set is at least as new as every .json source
+def is_compiled_set_fresh(compiled_path, json_paths):
+    try:
+        compiled_mtime = os.stat(compiled_path).st_mtime_ns
+        return all(os.stat(p).st_mtime_ns <= compiled_mtime for p in json_paths)
+    except OSError:
+        return False
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compile the unique/ address lists into a memory-mappable binary set')
+    parser.add_argument('unique_dir', nargs='?', default=os.path.join(os.path.dirname(os.path.dirname(__file__)), 'unique'))
+    parser.add_argument('-o', '--output', default=None)
+    parser.add_argument('--bloom-bits-per-address', type=int, default=DEFAULT_BLOOM_BITS_PER_ADDRESS,
+                        help='Bloom filter size per address, 0 disables the prefilter')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    count = compile_unique_dir(args.unique_dir, args.output, args.bloom_bits_per_address)
+    print(f"Compiled {count} addresses", file=sys.stderr)
@@ -0,0 +1,146 @@
+import os
+import re
+import time
+import logging
+import threading
+from functools import wraps
+from collections import OrderedDict
+import requests
+from flask import request, jsonify, g
+from google.auth import jwt as google_jwt
+from google.auth import exceptions as google_auth_exceptions
+
+logger = logging.getLogger(__name__)
+
+# Public certificates Firebase signs ID tokens with, rotated by Google every few hours
+FIREBASE_CERTS_URL = 'https://www.googleapis.com/robot/v1/metadata/x509/securetoken@system.gserviceaccount.com'
+FIREBASE_ISSUER_PREFIX = 'https://securetoken.google.com/'
+# Used when the certificate response has no max-age
+DEFAULT_CERTS_MAX_AGE = 3600
+# An unknown key id forces a refresh at most this often
+CERTS_MIN_REFRESH_INTERVAL = 60
+AUTH_TOKEN_CACHE_SIZE = int(os.getenv('AUTH_TOKEN_CACHE_SIZE', '10000'))
+CLOCK_SKEW_SECONDS = 60
+
+_max_age = re.compile(r'max-age=(\d+)')
+
+
+# Signing certificates cached for as long as Google's Cache-Control allows
+class PublicKeyCache:
+    def __init__(self, url=FIREBASE_CERTS_URL, timeout=10):
+        self.url = url
+        self.timeout = timeout
+        self._certs = {}
+        self._expires_at = 0.0
+        self._fetched_at = 0.0
+        self._lock = threading.Lock()
+
+    def _refresh(self):
+        response = requests.get(self.url, timeout=self.timeout)
+        response.raise_for_status()
+        match = _max_age.search(response.headers.get('Cache-Control', ''))
+        max_age = int(match.group(1)) if match else DEFAULT_CERTS_MAX_AGE
+        self._certs = response.json()
+        self._fetched_at = time.monotonic()
+        self._expires_at = self._fetched_at + max_age
+        logger.debug(f"Fetched {len(self._certs)} Firebase signing certificates, valid for {max_age}s")
+
+    def get(self, key_id=None):
+        now = time.monotonic()
+        certs = self._certs
+        stale = now >= self._expires_at
+        # Keys are rotated in ahead of use, but an unseen kid may mean we missed a rotation
+        unknown = key_id is not None and key_id not in certs and now - self._fetched_at >= CERTS_MIN_REFRESH_INTERVAL
+        if stale or unknown:
+            with self._lock:
+                if self._certs is certs:
+                    try:
+                        self._refresh()
+                    except (requests.exceptions.RequestException, ValueError) as e:
+                        # Keep verifying with the previous keys until Google answers again
+                        logger.error(f"Error refreshing Firebase signing certificates: {e}")
+                        if not self._certs:
+                            raise
+                        self._expires_at = now + CERTS_MIN_REFRESH_INTERVAL
+                certs = self._certs
+        return certs
+
+
+# Local Firebase ID token verification: signature, audience, issuer, expiry and
+# subject are checked against cached certificates, and verified tokens are
+# remembered until they expire, so a repeat request costs one dict lookup.
+class TokenVerifier:
+    def __init__(self, project_id, key_cache=None, max_entries=AUTH_TOKEN_CACHE_SIZE):
+        self.project_id = project_id
+        self.issuer = FIREBASE_ISSUER_PREFIX + project_id
+        self.key_cache = key_cache or PublicKeyCache()
+        self.max_entries = max_entries
+        self._verified = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _cached(self, token):
+        with self._lock:
+            item = self._verified.get(token)
+            if item is None:
+                return None
+            if item['exp'] <= time.time():
+                del self._verified[token]
+                return None
+            self._verified.move_to_end(token)
+            return item
+
+    def _remember(self, token, claims):
+        with self._lock:
+            self._verified[token] = claims
+            self._verified.move_to_end(token)
+            while len(self._verified) > self.max_entries:
+                self._verified.popitem(last=False)
+
+    # Function to return the token's claims (with 'uid') or None when it is not a valid ID token
+    def verify(self, token):
+        if not token:
+            return None
+        if token.startswith('Bearer '):
+            token = token[len('Bearer '):].strip()
+
+        claims = self._cached(token)
+        if claims is not None:
+            return claims
+
+        try:
+            header = google_jwt.decode_header(token)
+            if header.get('alg') != 'RS256':
+                return None
+            certs = self.key_cache.get(header.get('kid'))
+            claims = google_jwt.decode(token, certs=certs, audience=self.project_id,
+                                       clock_skew_in_seconds=CLOCK_SKEW_SECONDS)
+        except (ValueError, google_auth_exceptions.GoogleAuthError) as e:
+            logger.debug(f"Rejected ID token: {e}")
+            return None
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Cannot verify ID token without signing certificates: {e}")
+            return None
+
+        subject = claims.get('sub')
+        if claims.get('iss') != self.issuer or not isinstance(subject, str) or not subject or len(subject) > 128:
+            return None
+        claims = dict(claims, uid=subject)
+        self._remember(token, claims)
+        return claims
+
+
+# Decorator for routes that need a signed-in user; the verified claims are in g.user
+def require_auth(verifier):
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            token = request.headers.get('Authorization')
+            if not token:
+                return jsonify({'error': 'Token required'}), 401
+            decoded_token = verifier.verify(token)
+            if not decoded_token:
+                return jsonify({'error': 'Invalid token'}), 401
+            g.user = decoded_token
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,37 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+SCREENING_CONCURRENCY = int(os.getenv('SCREENING_CONCURRENCY', '8'))
+
+
+# Function to normalize addresses so repeated rows in a batch are screened once
+def address_key(address):
+    return address.lower() if isinstance(address, str) else address
+
+
+# Function to run fn over a batch with bounded concurrency. Repeated items (by key)
+# are only processed once and share their result; output order matches the input,
+# and a result dict carries the address spelling of each input row.
+def run_batch(items, fn, max_workers=SCREENING_CONCURRENCY, key=address_key):
+    items = list(items)
+    first_item = {}
+    for item in items:
+        first_item.setdefault(key(item), item)
+
+    if not first_item:
+        return []
+    if len(first_item) == 1 or max_workers <= 1:
+        results = {k: fn(item) for k, item in first_item.items()}
+    else:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(first_item)), thread_name_prefix='screening') as pool:
+            futures = {k: pool.submit(fn, item) for k, item in first_item.items()}
+            results = {k: future.result() for k, future in futures.items()}
+
+    output = []
+    for item in items:
+        result = results[key(item)]
+        # A repeat spelled differently (e.g. in another letter case) reports its own address
+        if item != first_item[key(item)] and isinstance(result, dict) and 'address' in result:
+            result = dict(result, address=item)
+        output.append(result)
+    return output
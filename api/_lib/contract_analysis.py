@@ -0,0 +1,205 @@
+import os
+import re
+import json
+import time
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from api._lib.genai import GenAIError, content_hash, pack_batches, GENAI_CONCURRENCY
+from api._lib.singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+# Largest piece of normalized source sent in one prompt
+CONTRACT_CHUNK_CHARS = int(os.getenv('CONTRACT_CHUNK_CHARS', '12000'))
+CONTRACT_CACHE_TTL = float(os.getenv('CONTRACT_CACHE_TTL', str(7 * 24 * 3600)))
+CONTRACT_CACHE_MAX_ENTRIES = int(os.getenv('CONTRACT_CACHE_MAX_ENTRIES', '1000'))
+
+CONTRACT_ANALYSIS_PROMPT = (
+    "You audit Solidity smart contracts. Analyze the code below (it may be one part of a larger "
+    "file). Reply with a JSON object of the form "
+    '{"summary": "<what the code does>", "findings": [{"severity": "high|medium|low|info", '
+    '"issue": "<problem>", "location": "<contract/function>"}]}.'
+)
+
+# Comments and string literals; strings are matched so comment markers inside them survive
+_COMMENT_OR_STRING = re.compile(r'//[^\n]*|/\*.*?\*/|"(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\'', re.S)
+
+
+# Function to normalize Solidity source for hashing and prompting: comments are
+# dropped and whitespace collapsed, so formatting-only copies share one analysis
+def normalize_source(code):
+    code = _COMMENT_OR_STRING.sub(lambda m: m.group(0) if m.group(0)[0] in '"\'' else ' ', code.replace('\r\n', '\n'))
+    lines = (' '.join(line.split()) for line in code.split('\n'))
+    return '\n'.join(line for line in lines if line)
+
+
+# Function to split source into its top-level statements and blocks (a `;` or a
+# closing `}` at depth 0 ends one), ignoring braces inside string literals
+def split_top_level(code):
+    segments = []
+    depth = 0
+    start = 0
+    position = 0
+    while position < len(code):
+        char = code[position]
+        if char in '"\'':
+            match = _COMMENT_OR_STRING.match(code, position)
+            position = match.end() if match else position + 1
+            continue
+        if char == '{':
+            depth += 1
+        elif char == '}':
+            depth = max(0, depth - 1)
+        if depth == 0 and char in ';}':
+            segment = code[start:position + 1].strip()
+            if segment:
+                segments.append(segment)
+            start = position + 1
+        position += 1
+    tail = code[start:].strip()
+    if tail:
+        segments.append(tail)
+    return segments
+
+
+def _hard_split(text, max_chars):
+    return [text[i:i + max_chars] for i in range(0, len(text), max_chars)]
+
+
+# Function to cut a normalized file into named chunks of at most max_chars: groups
+# of whole contracts, or groups of members of a contract too large on its own.
+# File-level statements (pragma, import, free definitions) are repeated as context.
+def chunk_source(code, max_chars=CONTRACT_CHUNK_CHARS):
+    if len(code) <= max_chars:
+        return [('file', code)]
+
+    header = []
+    units = []
+    for segment in split_top_level(code):
+        if '{' in segment and segment.endswith('}'):
+            units.append(segment)
+        else:
+            header.append(segment)
+    prefix = '\n'.join(header)
+    if len(prefix) > max_chars // 2:
+        prefix = prefix[:max_chars // 2]
+
+    chunks = []
+    budget = max(1, max_chars - len(prefix) - 1)
+    # Contracts that fit are packed together, so small ones share a prompt
+    fitting = [unit for unit in units if len(unit) + 1 <= budget]
+    for group in pack_batches(fitting, text=lambda unit: unit + '\n', max_items=len(fitting), max_chars=budget):
+        name = ', '.join(unit[:unit.index('{')].strip() for unit in group)
+        chunks.append((name, '\n'.join([prefix, *group]).strip()))
+    for unit in units:
+        if len(unit) + 1 <= budget:
+            continue
+        signature = unit[:unit.index('{')].strip()[:max_chars // 4]
+        # Too large: group the contract's members, each group wrapped in the contract signature
+        body = unit[unit.index('{') + 1:unit.rindex('}')]
+        member_budget = max(2, budget - len(signature) - 4)
+        members = []
+        for member in split_top_level(body):
+            members.extend(_hard_split(member, member_budget - 1) if len(member) >= member_budget else [member])
+        for number, group in enumerate(pack_batches(members, text=lambda member: member + '\n', max_items=len(members),
+                                                    max_chars=member_budget), start=1):
+            group_body = '\n'.join(group)
+            chunks.append((f"{signature} (part {number})", f"{prefix}\n{signature} {{\n{group_body}\n}}".strip()))
+    if not chunks:
+        chunks = [(f"part {number}", part) for number, part in enumerate(_hard_split(code, max_chars), start=1)]
+    return chunks
+
+
+# Cached map-reduce analysis of Solidity sources. Results are keyed by the hash of
+# the normalized source, so repeat uploads of the same code cost no model calls;
+# large files are analyzed chunk by chunk in parallel and the findings merged.
+# Concurrent uploads of the same source wait for one analysis.
+class ContractAnalyzer:
+    def __init__(self, client, max_chunk_chars=CONTRACT_CHUNK_CHARS, max_workers=GENAI_CONCURRENCY,
+                 ttl=CONTRACT_CACHE_TTL, max_entries=CONTRACT_CACHE_MAX_ENTRIES):
+        self.client = client
+        self.max_chunk_chars = max_chunk_chars
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='contract-analysis')
+        self._flights = SingleFlight()
+
+    def _cache_get(self, key):
+        with self._lock:
+            item = self._cache.get(key)
+            if item is None or time.monotonic() - item[0] >= self.ttl:
+                return None
+            self._cache.move_to_end(key)
+            return item[1]
+
+    def _cache_put(self, key, analysis):
+        with self._lock:
+            self._cache[key] = (time.monotonic(), analysis)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+
+    def _analyze_chunk(self, chunk):
+        name, code = chunk
+        content = self.client.complete(
+            [{'role': 'system', 'content': CONTRACT_ANALYSIS_PROMPT}, {'role': 'user', 'content': code}],
+            json_response=True
+        )
+        try:
+            result = json.loads(content)
+            findings = result.get('findings') or []
+            if not isinstance(findings, list):
+                raise TypeError('findings is not a list')
+        except (ValueError, TypeError, AttributeError) as e:
+            raise GenAIError(f"Malformed GenAI response for {name}: {e}")
+        return {'name': name, 'summary': result.get('summary', ''), 'findings': findings}
+
+    @staticmethod
+    def _merge(sections):
+        findings = []
+        seen = set()
+        for section in sections:
+            for finding in section['findings']:
+                if not isinstance(finding, dict):
+                    finding = {'issue': str(finding)}
+                key = (str(finding.get('issue', '')).strip().lower(), str(finding.get('location', '')).strip().lower())
+                if key in seen:
+                    continue
+                seen.add(key)
+                findings.append(dict(finding, section=section['name']))
+        if len(sections) == 1:
+            summary = sections[0]['summary']
+        else:
+            summary = '\n'.join(f"{section['name']}: {section['summary']}" for section in sections)
+        return {
+            'summary': summary,
+            'findings': findings,
+            'sections': [{'name': section['name'], 'summary': section['summary']} for section in sections]
+        }
+
+    # Function to analyze one source file; returns (analysis, source_hash, cached)
+    def analyze(self, code):
+        normalized = normalize_source(code)
+        source_hash = content_hash(normalized)
+        cached = self._cache_get(source_hash)
+        if cached is not None:
+            return cached, source_hash, True
+
+        analysis = self._flights.do(source_hash, self._analyze_source, normalized, source_hash)
+        return analysis, source_hash, False
+
+    def _analyze_source(self, normalized, source_hash):
+        # An upload of the same source may have finished since the cache was checked
+        cached = self._cache_get(source_hash)
+        if cached is not None:
+            return cached
+
+        chunks = chunk_source(normalized, self.max_chunk_chars)
+        sections = list(self._pool.map(self._analyze_chunk, chunks))
+        analysis = self._merge(sections)
+        self._cache_put(source_hash, analysis)
+        return analysis
@@ -0,0 +1,362 @@
+import os
+import json
+import datetime
+from decimal import Decimal
+from collections import OrderedDict, deque
+import numpy as np
+from api._lib.tx_frame import TransactionFrame
+
+# Registry of detectors by name, filled by @register_detector
+DETECTORS = {}
+
+# Etherscan values are wei strings; dust is anything below 0.001 ETH
+DUST_THRESHOLD_ETH = 0.001
+# Thresholds of the risk scores, compared against the raw value column
+DUST_RISK_VALUE = 0.0001
+TARGETED_RISK_VALUE = 1
+
+
+def register_detector(cls):
+    DETECTORS[cls.name] = cls
+    return cls
+
+
+# A detector sees every page of history once through process_frame() and
+# returns its result from finalize(). Row-by-row detectors only implement
+# process(tx); vectorized ones override process_frame. The shared context
+# carries what the request knows (address, address_index, tx_type) so detectors
+# never refetch anything. source is the Etherscan account action whose history
+# the detector reads.
+class Detector:
+    name = None
+    source = 'txlist'
+
+    def __init__(self, context):
+        self.context = context
+
+    def process(self, tx):
+        raise NotImplementedError
+
+    def process_frame(self, tx_frame):
+        for tx in tx_frame.transactions:
+            self.process(tx)
+
+    def finalize(self):
+        raise NotImplementedError
+
+
+# Function to instantiate registered detectors by name; unknown names raise KeyError
+def create_detectors(names, context):
+    return [DETECTORS[name](context) for name in names]
+
+
+# Function to feed pages of history through all detectors, each page once
+def run_detectors(pages, detectors):
+    hooks = [detector.process_frame for detector in detectors]
+    for page in pages:
+        tx_frame = TransactionFrame(page)
+        for hook in hooks:
+            hook(tx_frame)
+    return {detector.name: detector.finalize() for detector in detectors}
+
+
+# Function to run one detector over a single, already built TransactionFrame
+def run_frame_detector(name, tx_frame, context=None):
+    detector = DETECTORS[name](context or {})
+    detector.process_frame(tx_frame)
+    return detector.finalize()
+
+
+def dusting_attack_score(dust_tx):
+    return min(100, dust_tx * 10)
+
+
+def targeted_attack_score(high_value_tx):
+    return min(100, high_value_tx * 5)
+
+
+# Function to build the flagged-interaction summary returned by /api/transaction_summary
+def flagged_summary(risky_transactions_count, total_value, dates_involved, entities_involved):
+    return {
+        'number_of_interactions_with_flagged_addresses': risky_transactions_count,
+        'number_of_risky_transactions': risky_transactions_count,
+        'total_value': total_value,
+        'all_dates_involved': sorted(list(dates_involved)),
+        'flagged_entities_involved': [
+            {'root': root, 'category': category} for root, category in sorted(entities_involved.items())
+        ]
+    }
+
+
+@register_detector
+class DustingPatternsDetector(Detector):
+    name = 'dusting_patterns'
+
+    def __init__(self, context):
+        super().__init__(context)
+        self.patterns = []
+
+    def process(self, tx):
+        value_eth = int(tx['value']) / 1e18  # Convert from Wei to Ether
+        if 0 < value_eth < DUST_THRESHOLD_ETH:
+            self.patterns.append({
+                'transactionHash': tx['hash'],
+                'from': tx['from'],
+                'to': tx['to'],
+                'value': value_eth,
+                'timestamp': datetime.datetime.fromtimestamp(int(tx['timeStamp'])).isoformat()
+            })
+
+    def finalize(self):
+        return self.patterns
+
+
+# First transaction touching a sanctioned address, as shown in screening descriptions
+@register_detector
+class UniqueInteractionDetector(Detector):
+    name = 'unique_interaction'
+
+    def __init__(self, context):
+        super().__init__(context)
+        self.unique_addresses = context['address_index'].unique_addresses
+        self.tx_type = context.get('tx_type', 'Regular')
+        self.match = None
+
+    def process(self, tx):
+        if self.match is None and (tx['to'].lower() in self.unique_addresses or tx['from'].lower() in self.unique_addresses):
+            self.match = {
+                'transaction_type': self.tx_type,
+                'transaction_hash': tx['hash'],
+                'from': tx['from'],
+                'to': tx['to'],
+                'etherscan_url': f"https://etherscan.io/tx/{tx['hash']}"
+            }
+
+    def finalize(self):
+        return self.match
+
+
+# Interactions with flagged addresses, as returned by /api/transaction_summary.
+# Each page is evaluated as a TransactionFrame and the partial results merged.
+@register_detector
+class FlaggedSummaryDetector(Detector):
+    name = 'flagged_summary'
+
+    def __init__(self, context):
+        super().__init__(context)
+        self.address_index = context['address_index']
+        # Counterparties repeat across pages, so each distinct address is looked up once
+        self._lookups = {}
+        self.count = 0
+        self.total_value = 0.0
+        self.dates = set()
+        self.entities = {}
+
+    def process_frame(self, tx_frame):
+        flagged_mask = np.zeros(len(tx_frame), dtype=bool)
+
+        # Check both sender and receiver addresses against flagged and unique addresses
+        for side in ('from', 'to'):
+            addresses = tx_frame.lower(side)
+            hits = set()
+            for address in addresses.cat.categories:
+                if address not in self._lookups:
+                    self._lookups[address] = self.address_index.lookup(address)
+                entity = self._lookups[address]
+                if entity:
+                    hits.add(address)
+                    self.entities[entity.root] = entity.category
+            # Consider transaction flagged if either address is flagged
+            flagged_mask |= addresses.isin(hits).to_numpy()
+
+        page_count = int(flagged_mask.sum())
+        if page_count:
+            self.count += page_count
+            self.total_value += float(tx_frame.values[flagged_mask].sum())
+            for timestamp in np.unique(tx_frame.column('timeStamp')[flagged_mask]):
+                self.dates.add(datetime.datetime.fromtimestamp(int(timestamp)).strftime('%Y-%m-%d'))
+
+    def finalize(self):
+        return flagged_summary(self.count, self.total_value, self.dates, self.entities)
+
+
+@register_detector
+class DustingRiskDetector(Detector):
+    name = 'dusting_risk'
+
+    def __init__(self, context):
+        super().__init__(context)
+        self.dust_tx = 0
+
+    def process_frame(self, tx_frame):
+        self.dust_tx += int((tx_frame.values < DUST_RISK_VALUE).sum())
+
+    def finalize(self):
+        return dusting_attack_score(self.dust_tx)
+
+
+@register_detector
+class TargetedRiskDetector(Detector):
+    name = 'targeted_risk'
+
+    def __init__(self, context):
+        super().__init__(context)
+        self.high_value_tx = 0
+
+    def process_frame(self, tx_frame):
+        self.high_value_tx += int((tx_frame.values > TARGETED_RISK_VALUE).sum())
+
+    def finalize(self):
+        return targeted_attack_score(self.high_value_tx)
+
+
+# Per-token dust thresholds in whole token units, keyed by lowercase contract
+# address or uppercase symbol, e.g. TOKEN_DUST_THRESHOLDS='{"USDT": 0.01}'
+DEFAULT_TOKEN_DUST_THRESHOLDS = {'USDT': '0.01', 'USDC': '0.01', 'DAI': '0.01', 'WETH': '0.001'}
+TOKEN_DUST_DEFAULT_THRESHOLD = os.getenv('TOKEN_DUST_DEFAULT_THRESHOLD', '0.001')
+TOKEN_DUST_THRESHOLDS = dict(DEFAULT_TOKEN_DUST_THRESHOLDS, **json.loads(os.getenv('TOKEN_DUST_THRESHOLDS', '{}')))
+# A sender of inbound dust is reported when it sends the wallet this many dust
+# transfers within the window, or when the transaction store has seen it
+# transact with this many wallets
+DUST_BURST_WINDOW_SECONDS = int(os.getenv('DUST_BURST_WINDOW_SECONDS', '3600'))
+DUST_BURST_MIN_TRANSFERS = int(os.getenv('DUST_BURST_MIN_TRANSFERS', '5'))
+DUST_SENDER_MIN_WALLETS = int(os.getenv('DUST_SENDER_MIN_WALLETS', '5'))
+# Memory bounds: tracked senders, reported tokens and senders, and sample transfers
+TOKEN_DUST_MAX_SENDERS = int(os.getenv('TOKEN_DUST_MAX_SENDERS', '10000'))
+TOKEN_DUST_MAX_WINDOW_EVENTS = 1000
+TOKEN_DUST_MAX_TOKENS = 500
+TOKEN_DUST_MAX_SAMPLES = 100
+# Senders whose reach is looked up in the store, most active first
+TOKEN_DUST_MAX_REPORTED_SENDERS = 100
+
+
+# Dust threshold of one token in its smallest unit, from its symbol or contract
+def token_dust_threshold(contract, symbol, decimals):
+    threshold = TOKEN_DUST_THRESHOLDS.get(contract, TOKEN_DUST_THRESHOLDS.get(symbol.upper(), TOKEN_DUST_DEFAULT_THRESHOLD))
+    return Decimal(str(threshold)).scaleb(decimals)
+
+
+# Sliding window over one sender's recent dust transfers to the wallet
+class _SenderWindow:
+    __slots__ = ('sender', 'events', 'transfers', 'max_burst', 'first_seen', 'last_seen')
+
+    def __init__(self, sender):
+        self.sender = sender
+        self.events = deque()
+        self.transfers = 0
+        self.max_burst = 0
+        self.first_seen = None
+        self.last_seen = None
+
+
+# ERC-20 dust detector over `tokentx` transfers. Inbound dust is grouped by
+# sender: a sender is reported when it sends the wallet a burst of dust, or when
+# context['sender_reach'] (the store's count of wallets it transacted with) shows
+# it spraying many wallets. Everything is updated per transfer, so it can consume
+# pages as they arrive; memory is bounded by the caps above however many spam
+# transfers an address has.
+@register_detector
+class TokenDustingDetector(Detector):
+    name = 'token_dusting'
+    source = 'tokentx'
+
+    def __init__(self, context):
+        super().__init__(context)
+        self.address = (context.get('address') or '').lower()
+        self.sender_reach = context.get('sender_reach')
+        self.transfers_seen = 0
+        self.dust_transfers = 0
+        self.received_dust_transfers = 0
+        self.tokens = {}
+        self.samples = []
+        self._thresholds = {}
+        self._senders = OrderedDict()
+
+    def _threshold(self, tx):
+        contract = tx.get('contractAddress', '').lower()
+        if contract not in self._thresholds:
+            try:
+                decimals = int(tx.get('tokenDecimal') or 0)
+            except ValueError:
+                decimals = 0
+            self._thresholds[contract] = token_dust_threshold(contract, tx.get('tokenSymbol', ''), decimals)
+        return contract, self._thresholds[contract]
+
+    def _track_sender(self, sender, timestamp, tx):
+        window = self._senders.pop(sender, None) or _SenderWindow(tx['from'])
+        # Most recently active senders are kept; the oldest is forgotten at the cap
+        self._senders[sender] = window
+        if len(self._senders) > TOKEN_DUST_MAX_SENDERS:
+            self._senders.popitem(last=False)
+
+        window.events.append(timestamp)
+        while window.events and (timestamp - window.events[0] > DUST_BURST_WINDOW_SECONDS
+                                 or len(window.events) > TOKEN_DUST_MAX_WINDOW_EVENTS):
+            window.events.popleft()
+        window.transfers += 1
+        window.max_burst = max(window.max_burst, len(window.events))
+        if window.first_seen is None:
+            window.first_seen = timestamp
+        window.last_seen = timestamp
+
+    def _dusting_senders(self):
+        candidates = sorted(self._senders.values(), key=lambda window: (-window.max_burst, -window.transfers))
+        senders = []
+        for window in candidates[:TOKEN_DUST_MAX_REPORTED_SENDERS]:
+            reach = self.sender_reach(window.sender) if self.sender_reach else None
+            if window.max_burst < DUST_BURST_MIN_TRANSFERS and (reach is None or reach < DUST_SENDER_MIN_WALLETS):
+                continue
+            senders.append({
+                'sender': window.sender,
+                'dust_transfers': window.transfers,
+                'max_transfers_in_window': window.max_burst,
+                'wallets_reached': reach,
+                'first_seen': window.first_seen,
+                'last_seen': window.last_seen
+            })
+        return sorted(senders, key=lambda sender: (-(sender['wallets_reached'] or 0), -sender['max_transfers_in_window']))
+
+    def process(self, tx):
+        self.transfers_seen += 1
+        contract, threshold = self._threshold(tx)
+        if int(tx['value']) >= threshold:
+            return
+
+        recipient = tx['to'].lower()
+        sender = tx['from'].lower()
+        timestamp = int(tx['timeStamp'])
+        self.dust_transfers += 1
+        # Only dust sent to the wallet by someone else says anything about its senders
+        if recipient == self.address and sender != self.address:
+            self.received_dust_transfers += 1
+            self._track_sender(sender, timestamp, tx)
+        token = self.tokens.get(contract)
+        if token is None and len(self.tokens) < TOKEN_DUST_MAX_TOKENS:
+            token = self.tokens[contract] = {
+                'contract': contract,
+                'symbol': tx.get('tokenSymbol', ''),
+                'dust_transfers': 0
+            }
+        if token is not None:
+            token['dust_transfers'] += 1
+
+        if len(self.samples) < TOKEN_DUST_MAX_SAMPLES:
+            self.samples.append({
+                'transactionHash': tx['hash'],
+                'from': tx['from'],
+                'to': tx['to'],
+                'token': tx.get('tokenSymbol', ''),
+                'contract': contract,
+                'value': tx['value'],
+                'timestamp': datetime.datetime.fromtimestamp(timestamp).isoformat()
+            })
+
+    def finalize(self):
+        return {
+            'transfers_seen': self.transfers_seen,
+            'dust_transfers': self.dust_transfers,
+            'received_dust_transfers': self.received_dust_transfers,
+            'tokens': sorted(self.tokens.values(), key=lambda token: -token['dust_transfers']),
+            'dusting_senders': self._dusting_senders(),
+            'samples': self.samples
+        }
@@ -0,0 +1,196 @@
+import os
+import time
+import random
+import logging
+import threading
+import requests
+from collections import Counter
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+ETHERSCAN_API_URL = 'https://api.etherscan.io/api'
+
+# Etherscan free tier allows 5 calls per second per key
+ETHERSCAN_RATE_LIMIT = float(os.getenv('ETHERSCAN_RATE_LIMIT', '5'))
+ETHERSCAN_TIMEOUT = (3.05, float(os.getenv('ETHERSCAN_TIMEOUT', '30')))
+ETHERSCAN_MAX_RETRIES = int(os.getenv('ETHERSCAN_MAX_RETRIES', '5'))
+ETHERSCAN_POOL_SIZE = int(os.getenv('ETHERSCAN_POOL_SIZE', '20'))
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+END_BLOCK = 99999999
+# Etherscan returns at most this many records per query (page * offset)
+ETHERSCAN_RESULT_WINDOW = 10000
+ETHERSCAN_PAGE_SIZE = min(int(os.getenv('ETHERSCAN_PAGE_SIZE', '10000')), ETHERSCAN_RESULT_WINDOW)
+
+
+# Raised when Etherscan keeps failing after all retries, instead of returning an
+# empty result that would look like a wallet without transactions
+class EtherscanError(requests.exceptions.RequestException):
+    pass
+
+
+# Thread-safe token bucket shared by every request thread of the process
+class TokenBucket:
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+# Fields Etherscan recomputes on every call (confirmations grows with each new
+# block); they are not part of a record's identity and are not stored
+VOLATILE_FIELDS = frozenset({'confirmations'})
+
+
+# Function to drop the volatile fields of a record
+def stable_record(tx):
+    return {key: value for key, value in tx.items() if key not in VOLATILE_FIELDS}
+
+
+# Function to identify a record across calls: every field except the volatile
+# ones. The hash alone is not enough, one transaction can carry several token
+# transfers or internal calls.
+def record_key(tx):
+    return tuple(sorted((key, value) for key, value in tx.items() if key not in VOLATILE_FIELDS))
+
+
+# Function to drop records of the boundary block that an earlier page already
+# yielded; seen is a Counter of record keys and is consumed as matches are found
+def skip_seen(page, seen):
+    if not seen:
+        return page
+    fresh = []
+    for tx in page:
+        key = record_key(tx)
+        if seen[key] > 0:
+            seen[key] -= 1
+        else:
+            fresh.append(tx)
+    return fresh
+
+
+# Function to detect Etherscan's throttling answer, which comes back as HTTP 200
+def is_rate_limited(data):
+    return data.get('status') == '0' and 'rate limit' in str(data.get('result', '')).lower()
+
+
+# Function to detect the empty-history answer ("No transactions found", "No token
+# transfers found", ...), which is also reported as status 0
+def is_empty_result(data):
+    return data.get('status') == '0' and isinstance(data.get('result'), list) and str(data.get('message', '')).lower().startswith('no ')
+
+
+class EtherscanClient:
+    def __init__(self, api_key, rate_limit=ETHERSCAN_RATE_LIMIT, timeout=ETHERSCAN_TIMEOUT,
+                 max_retries=ETHERSCAN_MAX_RETRIES, backoff_base=0.5, pool_size=ETHERSCAN_POOL_SIZE):
+        self.api_key = api_key
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.limiter = TokenBucket(rate_limit)
+
+        # Keep-alive connections reused by all threads
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def _backoff(self, attempt):
+        delay = self.backoff_base * (2 ** attempt) + random.uniform(0, self.backoff_base)
+        time.sleep(delay)
+
+    # Low level call returning the decoded JSON body, retrying throttled and transient failures
+    def call(self, module, action, **params):
+        query = {'module': module, 'action': action, 'apikey': self.api_key}
+        query.update(params)
+
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            self.limiter.acquire()
+            try:
+                response = self.session.get(ETHERSCAN_API_URL, params=query, timeout=self.timeout)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                last_error = f"{type(e).__name__}: {e}"
+            else:
+                if response.status_code in RETRYABLE_STATUS_CODES:
+                    last_error = f"HTTP {response.status_code}"
+                elif response.status_code != 200:
+                    raise EtherscanError(f"Etherscan API returned HTTP {response.status_code} for {action}")
+                else:
+                    data = response.json()
+                    if not is_rate_limited(data):
+                        return data
+                    last_error = data.get('result')
+
+            if attempt < self.max_retries:
+                logger.warning(f"Etherscan {action} attempt {attempt + 1} failed ({last_error}), retrying")
+                self._backoff(attempt)
+
+        raise EtherscanError(f"Etherscan {action} failed after {self.max_retries + 1} attempts: {last_error}")
+
+    # Account list actions (txlist, txlistinternal, tokentx, ...). An address without
+    # history yields [], any other Etherscan error is raised.
+    def get_account_list(self, action, address, **params):
+        data = self.call('account', action, address=address, **params)
+        if data.get('status') == '1':
+            return data.get('result', [])
+        if is_empty_result(data):
+            return []
+        raise EtherscanError(f"Etherscan {action} error: {data.get('message')} {data.get('result')}")
+
+    # Generator over a whole account history in ascending block order, one page
+    # (list) at a time. A query is capped at 10,000 records, so after a full page
+    # the next query restarts at the page's last block and skips the records of
+    # that block it has already yielded. Volatile fields are dropped, so records
+    # read back from the store look the same as freshly fetched ones.
+    def iter_account_pages(self, action, address, startblock=0, endblock=END_BLOCK, page_size=ETHERSCAN_PAGE_SIZE):
+        seen = Counter()
+        while startblock <= endblock:
+            page = self.get_account_list(
+                action, address, startblock=startblock, endblock=endblock, page=1, offset=page_size, sort='asc'
+            )
+            fresh = skip_seen(page, seen)
+            if fresh:
+                yield [stable_record(tx) for tx in fresh]
+            if len(page) < page_size:
+                return
+
+            last_block = int(page[-1]['blockNumber'])
+            if last_block == startblock:
+                # One block holds a whole page: walk it page by page instead
+                yield from self._iter_block_pages(action, address, last_block, page_size)
+                startblock = last_block + 1
+                seen = Counter()
+            else:
+                seen = Counter(record_key(tx) for tx in page if int(tx['blockNumber']) == last_block)
+                startblock = last_block
+
+    # Pages 2.. of a single block; page 1 is the full page that started it
+    def _iter_block_pages(self, action, address, block, page_size):
+        page_number = 2
+        while page_number * page_size <= ETHERSCAN_RESULT_WINDOW:
+            page = self.get_account_list(
+                action, address, startblock=block, endblock=block, page=page_number, offset=page_size, sort='asc'
+            )
+            if page:
+                yield [stable_record(tx) for tx in page]
+            if len(page) < page_size:
+                return
+            page_number += 1
+        logger.warning(f"Etherscan {action} for {address}: block {block} has more than {ETHERSCAN_RESULT_WINDOW} records, result truncated")
@@ -0,0 +1,83 @@
+import os
+import time
+import logging
+import threading
+from collections import defaultdict
+
+logger = logging.getLogger(__name__)
+
+EXPOSURE_REFRESH_INTERVAL = float(os.getenv('EXPOSURE_REFRESH_INTERVAL', '5'))
+
+
+# Reverse index over the transaction store: each flagged or sanctioned address
+# maps to the stored wallets that transacted with it, and each wallet to the
+# flagged counterparties it touched. Only rows added since the last refresh are
+# read; a new address index snapshot triggers a full rebuild.
+class ExposureIndex:
+    def __init__(self, store, address_index_loader, refresh_interval=EXPOSURE_REFRESH_INTERVAL):
+        self.store = store
+        self.address_index_loader = address_index_loader
+        self.refresh_interval = refresh_interval
+        self._wallets_by_flagged = defaultdict(set)
+        self._flagged_by_wallet = defaultdict(set)
+        self._entities = {}
+        self._address_index = None
+        self._last_row_id = 0
+        self._next_refresh = 0.0
+        self._lock = threading.Lock()
+
+    def refresh(self, force=False):
+        address_index = self.address_index_loader.get()
+        if not force and address_index is self._address_index and time.monotonic() < self._next_refresh:
+            return
+        with self._lock:
+            if address_index is not self._address_index:
+                self._wallets_by_flagged = defaultdict(set)
+                self._flagged_by_wallet = defaultdict(set)
+                self._entities = {}
+                self._last_row_id = 0
+                self._address_index = address_index
+
+            up_to_id = self.store.last_row_id()
+            if up_to_id > self._last_row_id:
+                # Counterparties repeat across wallets, so each is looked up once
+                lookups = {}
+                for wallet, counterparty in self.store.iter_links(self._last_row_id, up_to_id):
+                    if counterparty not in lookups:
+                        lookups[counterparty] = address_index.lookup(counterparty)
+                    entity = lookups[counterparty]
+                    if entity:
+                        self._entities[counterparty] = entity
+                        self._wallets_by_flagged[counterparty].add(wallet)
+                        self._flagged_by_wallet[wallet].add(counterparty)
+                logger.debug(f"Exposure index refreshed up to row {up_to_id}")
+                self._last_row_id = up_to_id
+            self._next_refresh = time.monotonic() + self.refresh_interval
+
+    def _describe(self, counterparty):
+        entity = self._entities[counterparty]
+        return {'address': counterparty, 'root': entity.root, 'category': entity.category}
+
+    # Wallets in the store that transacted with a flagged address
+    def wallets_exposed_to(self, flagged_address):
+        self.refresh()
+        # refresh() may be adding to these sets in another thread
+        with self._lock:
+            return sorted(self._wallets_by_flagged.get(flagged_address.lower(), ()))
+
+    # Per-wallet exposure for a batch of wallets, answered from the index alone.
+    # synced tells whether the store holds the wallet's history at all.
+    def exposure(self, wallets):
+        self.refresh()
+        synced = self.store.synced_addresses(wallets)
+        results = []
+        with self._lock:
+            for wallet in wallets:
+                counterparties = sorted(self._flagged_by_wallet.get(wallet.lower(), ()))
+                results.append({
+                    'address': wallet,
+                    'synced': wallet.lower() in synced,
+                    'exposed': bool(counterparties),
+                    'flagged_counterparties': [self._describe(counterparty) for counterparty in counterparties]
+                })
+        return results
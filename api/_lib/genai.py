@@ -0,0 +1,177 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+from api._lib.singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+# OPENAI_API_URL can point at a local OpenAI-compatible server for testing
+OPENAI_API_URL = os.getenv('OPENAI_API_URL', 'https://api.openai.com/v1/chat/completions')
+OPENAI_MODEL = os.getenv('OPENAI_MODEL', 'gpt-3.5-turbo-0125')
+OPENAI_TIMEOUT = (3.05, float(os.getenv('OPENAI_TIMEOUT', '60')))
+
+# Addresses per prompt, bounded by count and by the size of their screening text
+GENAI_BATCH_SIZE = int(os.getenv('GENAI_BATCH_SIZE', '20'))
+GENAI_BATCH_MAX_CHARS = int(os.getenv('GENAI_BATCH_MAX_CHARS', '12000'))
+GENAI_CONCURRENCY = int(os.getenv('GENAI_CONCURRENCY', '4'))
+GENAI_CACHE_TTL = float(os.getenv('GENAI_CACHE_TTL', '3600'))
+GENAI_CACHE_MAX_ENTRIES = int(os.getenv('GENAI_CACHE_MAX_ENTRIES', '10000'))
+
+ADDRESS_INSIGHTS_PROMPT = (
+    "You analyze Ethereum addresses for compliance screening. For each address below you get "
+    "its screening result. Reply with a JSON object of the form "
+    '{"results": [{"address": "<address>", "insight": "<analysis>"}]} '
+    "with exactly one entry per address."
+)
+
+
+class GenAIError(Exception):
+    pass
+
+
+# Thin chat-completions client with a pooled keep-alive session
+class GenAIClient:
+    def __init__(self, api_key, url=OPENAI_API_URL, model=OPENAI_MODEL, timeout=OPENAI_TIMEOUT,
+                 pool_size=GENAI_CONCURRENCY):
+        self.api_key = api_key
+        self.url = url
+        self.model = model
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    # Function to send one chat completion and return the message content
+    def complete(self, messages, json_response=False):
+        payload = {'model': self.model, 'messages': messages}
+        if json_response:
+            payload['response_format'] = {'type': 'json_object'}
+        response = self.session.post(
+            self.url,
+            headers={'Content-Type': 'application/json', 'Authorization': f'Bearer {self.api_key}'},
+            json=payload,
+            timeout=self.timeout
+        )
+        if response.status_code != 200:
+            raise GenAIError(f"OpenAI API request failed with status {response.status_code}")
+        return response.json()['choices'][0]['message']['content']
+
+
+def content_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+# Function to split items into batches of at most max_items and (unless a single
+# item is larger) at most max_chars of text
+def pack_batches(items, text, max_items=GENAI_BATCH_SIZE, max_chars=GENAI_BATCH_MAX_CHARS):
+    batches = []
+    batch = []
+    size = 0
+    for item in items:
+        length = len(text(item))
+        if batch and (len(batch) >= max_items or size + length > max_chars):
+            batches.append(batch)
+            batch = []
+            size = 0
+        batch.append(item)
+        size += length
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+# Per-address GenAI insights for screening results. Results are cached by
+# (address, hash of the screening description) for ttl seconds; misses are
+# packed into bounded sub-batches that run concurrently, and each reply is a
+# JSON object with one entry per address. Identical batches requested at the
+# same time (a hot address screened by many clients) share one model call.
+class AddressInsights:
+    def __init__(self, client, max_workers=GENAI_CONCURRENCY, ttl=GENAI_CACHE_TTL,
+                 max_entries=GENAI_CACHE_MAX_ENTRIES):
+        self.client = client
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='genai')
+        self._flights = SingleFlight()
+
+    def _cache_get(self, key):
+        with self._lock:
+            item = self._cache.get(key)
+            if item is None or time.monotonic() - item[0] >= self.ttl:
+                return None
+            self._cache.move_to_end(key)
+            return item[1]
+
+    def _cache_put(self, key, insight):
+        with self._lock:
+            self._cache[key] = (time.monotonic(), insight)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+
+    def _analyze_batch(self, batch):
+        # A request for the same batch may have finished since the cache was checked
+        cached = {address: self._cache_get((address.lower(), content_hash(description))) for address, description in batch}
+        if all(insight is not None for insight in cached.values()):
+            return cached
+
+        listing = json.dumps([{'address': address, 'screening_result': description} for address, description in batch])
+        content = self.client.complete(
+            [{'role': 'system', 'content': ADDRESS_INSIGHTS_PROMPT}, {'role': 'user', 'content': listing}],
+            json_response=True
+        )
+        try:
+            entries = json.loads(content)['results']
+            insights = {str(entry['address']).lower(): entry['insight'] for entry in entries}
+        except (ValueError, KeyError, TypeError) as e:
+            raise GenAIError(f"Malformed GenAI response: {e}")
+        batch_insights = {}
+        for address, description in batch:
+            insight = batch_insights[address] = insights.get(address.lower())
+            # An address the model skipped is retried next time instead of cached
+            if insight is not None:
+                self._cache_put((address.lower(), content_hash(description)), insight)
+        return batch_insights
+
+    # Function to return one insight per result ({'address', 'description'}), in order.
+    # Raises GenAIError if any sub-batch fails; the batches that succeeded stay cached.
+    def analyze(self, results):
+        insights = {}
+        missing = {}
+        for result in results:
+            key = (result['address'].lower(), content_hash(result['description']))
+            if key in insights or key in missing:
+                continue
+            cached = self._cache_get(key)
+            if cached is not None:
+                insights[key] = cached
+            else:
+                missing[key] = (result['address'], result['description'])
+
+        batches = pack_batches(list(missing.values()), text=lambda item: item[1])
+        futures = [self._pool.submit(self._flights.do, content_hash(json.dumps(batch)), self._analyze_batch, batch)
+                   for batch in batches]
+        error = None
+        for batch, future in zip(batches, futures):
+            try:
+                batch_insights = future.result()
+            except (GenAIError, requests.exceptions.RequestException) as e:
+                logger.error(f"Error analyzing {len(batch)} addresses with GenAI: {e}")
+                error = e
+                continue
+            for address, description in batch:
+                insights[(address.lower(), content_hash(description))] = batch_insights[address]
+        if error is not None:
+            raise GenAIError(f"GenAI analysis failed: {error}")
+
+        return [insights[(result['address'].lower(), content_hash(result['description']))] for result in results]
@@ -0,0 +1,178 @@
+import os
+import sys
+import time
+import logging
+import threading
+from collections import OrderedDict
+from api._lib.etherscan import END_BLOCK
+from api._lib.singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+HISTORY_CACHE_TTL = float(os.getenv('HISTORY_CACHE_TTL', '60'))
+HISTORY_CACHE_MAX_ENTRIES = int(os.getenv('HISTORY_CACHE_MAX_ENTRIES', '1024'))
+# Upper bound on the estimated memory of all cached transactions, so a few whale
+# wallets cannot hold the whole worker memory (a parsed txlist record is ~1.5 KB)
+HISTORY_CACHE_MAX_BYTES = int(os.getenv('HISTORY_CACHE_MAX_BYTES', str(128 * 1024 * 1024)))
+# Larger histories are streamed page by page and never held in the cache
+HISTORY_CACHE_MAX_ENTRY_BYTES = int(os.getenv('HISTORY_CACHE_MAX_ENTRY_BYTES', str(32 * 1024 * 1024)))
+# Records per page measured to estimate the size of the whole page
+SIZE_SAMPLE = 16
+
+
+class _Entry:
+    def __init__(self, transactions, size, last_block, fetched_at):
+        self.transactions = transactions
+        self.size = size
+        self.last_block = last_block
+        self.fetched_at = fetched_at
+
+
+# Function to estimate the memory held by a page of parsed records from a sample
+# of them: each dict and its values (the keys are shared between records)
+def estimate_page_bytes(page):
+    sample = page[:SIZE_SAMPLE]
+    if not sample:
+        return 0
+    sampled = sum(sys.getsizeof(tx) + sum(sys.getsizeof(value) for value in tx.values()) for tx in sample)
+    return sys.getsizeof(page) + sampled * len(page) // len(sample)
+
+
+# Function to find the highest block number of a history, -1 when empty
+def last_block_number(transactions, default=-1):
+    last_block = default
+    for tx in transactions:
+        block = int(tx.get('blockNumber', default))
+        if block > last_block:
+            last_block = block
+    return last_block
+
+
+# TTL + LRU cache of per-address Etherscan account lists keyed by (address, action).
+# Expired entries are refreshed incrementally from last_seen_block + 1 and the
+# new transactions appended, instead of refetching the history from block 0.
+# With a TransactionStore below it, a memory miss reads the history from disk
+# and only blocks after the stored sync point are fetched (and persisted).
+# Concurrent misses for the same key are coalesced: one request fetches while
+# the others wait and then read the refreshed entry (or the synced store).
+# Returned lists are shared between requests and must be treated as read-only.
+class HistoryCache:
+    def __init__(self, client, ttl=HISTORY_CACHE_TTL, max_entries=HISTORY_CACHE_MAX_ENTRIES,
+                 max_bytes=HISTORY_CACHE_MAX_BYTES, max_entry_bytes=HISTORY_CACHE_MAX_ENTRY_BYTES, store=None):
+        self.client = client
+        self.store = store
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = min(max_entry_bytes, max_bytes)
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._flights = SingleFlight()
+
+    # Full history as one list, fetched page by page past the 10k result cap
+    def get(self, action, address):
+        pages = list(self.iter_pages(action, address))
+        return pages[0] if len(pages) == 1 else [tx for page in pages for tx in page]
+
+    # Generator over the history one non-empty page at a time, so analyzers can
+    # consume it incrementally. Pages are kept for the cache only while the
+    # history stays under max_entry_bytes; longer ones are streamed through.
+    def iter_pages(self, action, address):
+        key = (address.lower(), action)
+        entry, fresh = self._lookup(key)
+        if fresh:
+            if entry.transactions:
+                yield entry.transactions
+            return
+
+        with self._flights.lead(key):
+            # Another request may have refreshed this history in the meantime
+            entry, fresh = self._lookup(key)
+            if fresh:
+                if entry.transactions:
+                    yield entry.transactions
+                return
+            yield from self._refresh(key, action, address, entry)
+
+    def _lookup(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None, False
+            self._entries.move_to_end(key)
+            return entry, time.monotonic() - entry.fetched_at < self.ttl
+
+    def _refresh(self, key, action, address, entry):
+        fetched_at = time.monotonic()
+        up_to_date = False
+        if entry is not None:
+            known_pages = [entry.transactions] if entry.transactions else []
+            last_block = entry.last_block
+        elif self.store is not None:
+            state = self.store.get_state(address, action)
+            known_pages = self.store.iter_pages(address, action) if state else []
+            last_block = state.last_block if state else -1
+            up_to_date = state is not None and time.time() - state.synced_at < self.ttl
+        else:
+            known_pages = []
+            last_block = -1
+
+        transactions = []
+        size = 0
+        for page in known_pages:
+            if transactions is not None:
+                transactions.extend(page)
+                size += estimate_page_bytes(page)
+                if size > self.max_entry_bytes:
+                    transactions = None
+            yield page
+
+        if not up_to_date:
+            new_count = 0
+            synced_block = last_block
+            try:
+                for page in self.client.iter_account_pages(action, address, startblock=last_block + 1, endblock=END_BLOCK):
+                    if self.store is not None:
+                        self.store.append(address, action, page)
+                    new_count += len(page)
+                    synced_block = last_block_number(page, synced_block)
+                    if transactions is not None:
+                        transactions.extend(page)
+                        size += estimate_page_bytes(page)
+                        if size > self.max_entry_bytes:
+                            transactions = None
+                    yield page
+            except BaseException:
+                # Abandoned by the reader or failed: the store keeps nothing past its sync point
+                if self.store is not None:
+                    self.store.discard_unsynced(address, action)
+                raise
+            if self.store is not None:
+                self.store.mark_synced(address, action, synced_block)
+            if last_block >= 0:
+                logger.debug(f"Refreshed {action} for {address}: {new_count} new since block {last_block}")
+            last_block = synced_block
+
+        if transactions is not None:
+            self._store(key, _Entry(transactions, size, last_block, fetched_at))
+        else:
+            self.invalidate(address, action)
+
+    def invalidate(self, address, action=None):
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == address.lower() and (action is None or k[1] == action)]:
+                self._bytes -= self._entries.pop(key).size
+
+    def _store(self, key, entry):
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous.size
+            self._entries[key] = entry
+            self._bytes += entry.size
+
+            # Evict least recently used entries, but always keep the one just stored
+            while len(self._entries) > 1 and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.size
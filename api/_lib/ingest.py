@@ -0,0 +1,139 @@
+import re
+import csv
+import json
+import codecs
+from itertools import islice
+
+READ_CHUNK_SIZE = 64 * 1024
+
+_decoder = json.JSONDecoder()
+_whitespace = re.compile(r'\s*')
+_line_end = re.compile(r'\r\n|\r|\n')
+
+
+# Function to group an iterable into lists of at most size items
+def iter_chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+# Function to decode a binary stream into lines that keep their line endings.
+# Only read() is used, so any file-like object works (io.TextIOWrapper needs
+# readable(), which SpooledTemporaryFile lacks before Python 3.11).
+def iter_text_lines(binary_file, encoding='utf-8-sig'):
+    decoder = codecs.getincrementaldecoder(encoding)()
+    buffer = ''
+    eof = False
+    while not eof:
+        data = binary_file.read(READ_CHUNK_SIZE)
+        eof = not data
+        buffer += decoder.decode(data, final=eof)
+        start = 0
+        for match in _line_end.finditer(buffer):
+            # A trailing \r may be the first half of a \r\n in the next chunk
+            if not eof and match.group() == '\r' and match.end() == len(buffer):
+                break
+            yield buffer[start:match.end()]
+            start = match.end()
+        buffer = buffer[start:]
+    if buffer:
+        yield buffer
+
+
+# Function to stream one column of a CSV upload without loading the file
+def iter_csv_column(binary_file, column='address'):
+    reader = csv.reader(iter_text_lines(binary_file))
+    header = [name.strip() for name in next(reader, [])]
+    if column not in header:
+        raise ValueError(f"CSV file must have an '{column}' column")
+    position = header.index(column)
+    for row in reader:
+        if len(row) > position:
+            yield row[position]
+
+
+# Minimal pull parser over a binary JSON stream: only one top-level value is
+# decoded at a time, so memory is bounded by the largest single entry.
+class _JsonStream:
+    def __init__(self, binary_file):
+        self._file = binary_file
+        self._decoder = codecs.getincrementaldecoder('utf-8-sig')()
+        self._buffer = ''
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self):
+        data = self._file.read(READ_CHUNK_SIZE)
+        if not data:
+            self._eof = True
+        self._buffer = self._buffer[self._pos:] + self._decoder.decode(data, final=self._eof)
+        self._pos = 0
+
+    def peek(self):
+        while True:
+            self._pos = _whitespace.match(self._buffer, self._pos).end()
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if self._eof:
+                return ''
+            self._fill()
+
+    def next_char(self):
+        char = self.peek()
+        self._pos += len(char)
+        return char
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self._buffer, self._pos)
+                # A number cut at the buffer edge would decode as a shorter one
+                if end < len(self._buffer) or self._eof:
+                    self._pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+            self._fill()
+
+
+# Function to stream the addresses of a JSON upload: the keys of a top-level
+# object (the existing upload format) or the items of a top-level array
+def iter_json_addresses(binary_file):
+    stream = _JsonStream(binary_file)
+    opening = stream.next_char()
+    if opening not in ('{', '['):
+        raise ValueError('JSON file must be an object keyed by address or an array of addresses')
+    closing = '}' if opening == '{' else ']'
+
+    if stream.peek() == closing:
+        return
+    while True:
+        if opening == '{':
+            key = stream.value()
+            if stream.next_char() != ':':
+                raise ValueError('Malformed JSON object in upload')
+            stream.value()
+            yield key
+        else:
+            yield stream.value()
+
+        separator = stream.next_char()
+        if separator == closing:
+            return
+        if separator != ',':
+            raise ValueError('Malformed JSON in upload')
+
+
+# Function to stream raw addresses out of an uploaded .csv or .json file
+def iter_upload_addresses(binary_file, filename):
+    if filename.endswith('.csv'):
+        return iter_csv_column(binary_file, 'address')
+    if filename.endswith('.json'):
+        return iter_json_addresses(binary_file)
+    raise ValueError('Unsupported file type')
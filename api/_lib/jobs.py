@@ -0,0 +1,112 @@
+import os
+import time
+import uuid
+import logging
+import threading
+from itertools import islice
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', '2'))
+# Finished jobs are kept for polling until either limit is reached
+JOB_RETENTION_SECONDS = float(os.getenv('JOB_RETENTION_SECONDS', '3600'))
+JOB_MAX_FINISHED = int(os.getenv('JOB_MAX_FINISHED', '100'))
+# Only the latest rows of a job are kept for polling; the full set is in its results file
+JOB_RESULTS_TAIL = int(os.getenv('JOB_RESULTS_TAIL', '1000'))
+
+QUEUED = 'queued'
+RUNNING = 'running'
+COMPLETED = 'completed'
+FAILED = 'failed'
+
+
+# State of one background job. The worker appends results and bumps progress,
+# request threads read consistent snapshots through to_dict(). Only the last
+# results_tail rows stay in memory; processed/total count every row.
+class Job:
+    def __init__(self, job_id, uid=None, results_tail=JOB_RESULTS_TAIL):
+        self.id = job_id
+        self.uid = uid
+        self.status = QUEUED
+        self.total = None
+        self.processed = 0
+        self.results = deque(maxlen=results_tail)
+        self.file_url = None
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self._lock = threading.Lock()
+
+    def set_total(self, total):
+        with self._lock:
+            self.total = total
+
+    def add_results(self, results):
+        with self._lock:
+            self.results.extend(results)
+            self.processed += len(results)
+
+    # Rows before the kept tail are no longer available here; offset in the
+    # result is where the returned rows actually start
+    def to_dict(self, offset=0, limit=None):
+        with self._lock:
+            first_kept = self.processed - len(self.results)
+            offset = max(offset, first_kept)
+            end = self.processed if limit is None else min(self.processed, offset + limit)
+            return {
+                'job_id': self.id,
+                'status': self.status,
+                'total': self.total,
+                'processed': self.processed,
+                'file_url': self.file_url,
+                'error': self.error,
+                'results': list(islice(self.results, offset - first_kept, max(offset, end) - first_kept)),
+                'offset': offset,
+                'created_at': self.created_at,
+                'finished_at': self.finished_at
+            }
+
+
+class JobManager:
+    def __init__(self, max_workers=JOB_WORKERS, retention_seconds=JOB_RETENTION_SECONDS, max_finished=JOB_MAX_FINISHED):
+        self.retention_seconds = retention_seconds
+        self.max_finished = max_finished
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='jobs')
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    # Function to queue fn(job, *args); its return value becomes the job's file_url
+    def submit(self, fn, *args, uid=None):
+        job = Job(uuid.uuid4().hex, uid)
+        with self._lock:
+            self._purge()
+            self._jobs[job.id] = job
+        self._pool.submit(self._run, job, fn, args)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _run(self, job, fn, args):
+        job.status = RUNNING
+        try:
+            job.file_url = fn(job, *args)
+            job.status = COMPLETED
+        except Exception as e:
+            logger.error(f"Job {job.id} failed: {e}")
+            job.error = str(e)
+            job.status = FAILED
+        finally:
+            job.finished_at = time.time()
+
+    def _purge(self):
+        now = time.time()
+        finished = [job for job in self._jobs.values() if job.finished_at is not None]
+        expired = [job for job in finished if now - job.finished_at > self.retention_seconds]
+        overflow = max(0, len(finished) - len(expired) - self.max_finished)
+        remaining = [job for job in finished if job not in expired]
+        for job in expired + remaining[:overflow]:
+            self._jobs.pop(job.id, None)
@@ -0,0 +1,111 @@
+import heapq
+from collections import deque
+from decimal import Decimal, Context
+
+WEI_PER_ETH = 10 ** 18
+
+FIFO = 'fifo'
+LIFO = 'lifo'
+HIFO = 'hifo'
+MATCHING_METHODS = (FIFO, LIFO, HIFO)
+
+# Wide enough for wei amounts times prices without rounding
+DECIMAL_CONTEXT = Context(prec=60)
+
+
+# Function to convert an Etherscan value (wei as a decimal string) to an exact integer
+def to_wei(value):
+    if isinstance(value, int):
+        return value
+    try:
+        return int(value)
+    except ValueError:
+        return int(Decimal(str(value)))
+
+
+def wei_to_eth(amount_wei):
+    return DECIMAL_CONTEXT.divide(Decimal(amount_wei), Decimal(WEI_PER_ETH))
+
+
+class Lot:
+    __slots__ = ('amount_wei', 'price', 'timestamp', 'tx_hash')
+
+    def __init__(self, amount_wei, price, timestamp, tx_hash=None):
+        self.amount_wei = amount_wei
+        self.price = price
+        self.timestamp = timestamp
+        self.tx_hash = tx_hash
+
+
+# Open lots of one asset. Every buy and every consumed lot is O(1) for FIFO/LIFO
+# (deque) and O(log n) for HIFO (max-heap on price), so a history is matched in
+# linear (or n log n) time instead of rescanning a purchase list per sale.
+class LotLedger:
+    def __init__(self, method=FIFO):
+        if method not in MATCHING_METHODS:
+            raise ValueError(f"Unsupported lot matching method: {method}")
+        self.method = method
+        self._lots = [] if method == HIFO else deque()
+        self._sequence = 0
+
+    def __len__(self):
+        return len(self._lots)
+
+    def buy(self, amount_wei, price, timestamp, tx_hash=None):
+        if amount_wei <= 0:
+            return
+        lot = Lot(amount_wei, Decimal(price), timestamp, tx_hash)
+        if self.method == HIFO:
+            # Sequence keeps equal prices in FIFO order and avoids comparing Lots
+            heapq.heappush(self._lots, (-lot.price, self._sequence, lot))
+            self._sequence += 1
+        else:
+            self._lots.append(lot)
+
+    def _next_lot(self):
+        if self.method == FIFO:
+            return self._lots[0]
+        if self.method == LIFO:
+            return self._lots[-1]
+        return self._lots[0][2]
+
+    def _drop_next_lot(self):
+        if self.method == FIFO:
+            self._lots.popleft()
+        elif self.method == LIFO:
+            self._lots.pop()
+        else:
+            heapq.heappop(self._lots)
+
+    # Function to match a sale against open lots; returns one realized-gain entry per
+    # lot (or part of a lot) consumed, plus the wei that no open lot could cover
+    def sell(self, amount_wei, price, timestamp, tx_hash=None):
+        price = Decimal(price)
+        realized = []
+        remaining = amount_wei
+        while remaining > 0 and self._lots:
+            lot = self._next_lot()
+            matched = min(lot.amount_wei, remaining)
+            amount_eth = wei_to_eth(matched)
+            realized.append({
+                'amount_wei': matched,
+                'amount': amount_eth,
+                'purchase_price': lot.price,
+                'sale_price': price,
+                'gain': DECIMAL_CONTEXT.multiply(price - lot.price, amount_eth),
+                'acquired_at': lot.timestamp,
+                'disposed_at': timestamp,
+                'purchase_tx': lot.tx_hash,
+                'sale_tx': tx_hash
+            })
+            remaining -= matched
+            if matched == lot.amount_wei:
+                self._drop_next_lot()
+            else:
+                lot.amount_wei -= matched
+        return realized, remaining
+
+
+# Function to make a realized-gain entry JSON friendly; Decimals become exact strings
+def serialize_realized_gain(entry):
+    return {key: str(value) if isinstance(value, Decimal) else value for key, value in entry.items()}
@@ -0,0 +1,129 @@
+import os
+import logging
+import threading
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+PRICE_DATA_DIR = os.getenv('PRICE_DATA_DIR', os.path.join(os.path.dirname(os.path.dirname(__file__)), 'prices'))
+PRICE_FILE_EXTENSIONS = ('.parquet', '.csv')
+# Bar interval assumed for a history with a single row
+DEFAULT_BAR_SECONDS = 86400
+
+
+# Sorted price history of one symbol. Lookups return the last close at or
+# before the requested timestamp, in O(log n) per point via binary search.
+# Timestamps before the first row, or more than one bar interval (the median
+# spacing of the rows) after the last, have no price.
+class PriceSeries:
+    def __init__(self, timestamps, prices):
+        self.timestamps = timestamps
+        self.prices = prices
+        if len(timestamps) > 1:
+            self.bar_seconds = int(np.median(np.diff(timestamps)))
+        else:
+            self.bar_seconds = DEFAULT_BAR_SECONDS
+        self.covered_until = int(timestamps[-1]) + self.bar_seconds if len(timestamps) else None
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def price_at(self, timestamp):
+        i = int(np.searchsorted(self.timestamps, timestamp, side='right')) - 1
+        return float(self.prices[i]) if i >= 0 and timestamp <= self.covered_until else None
+
+    # Batch lookup for a whole wallet history; NaN outside the covered range
+    def prices_at(self, timestamps):
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        indexes = np.searchsorted(self.timestamps, timestamps, side='right') - 1
+        if not len(self.prices):
+            return np.full(len(timestamps), np.nan)
+        prices = self.prices[np.clip(indexes, 0, None)]
+        return np.where((indexes >= 0) & (timestamps <= self.covered_until), prices, np.nan)
+
+
+# Function to read an OHLC (or plain timestamp/price) file into a PriceSeries.
+# The time column is unix seconds or anything pandas can parse as a date; the
+# close column is used when present, otherwise price.
+def load_price_series(path):
+    if path.endswith('.parquet'):
+        # Parquet support needs pyarrow or fastparquet, which are optional
+        df = pd.read_parquet(path)
+    else:
+        df = pd.read_csv(path)
+    df.columns = [str(column).strip().lower() for column in df.columns]
+
+    time_column = next((c for c in ('timestamp', 'time', 'date') if c in df.columns), None)
+    price_column = next((c for c in ('close', 'price') if c in df.columns), None)
+    if time_column is None or price_column is None:
+        raise ValueError(f"Price file {path} needs a timestamp/date column and a close/price column")
+
+    times = df[time_column]
+    if pd.api.types.is_numeric_dtype(times):
+        timestamps = times.to_numpy(dtype=np.int64)
+    else:
+        parsed = pd.to_datetime(times, utc=True)
+        timestamps = ((parsed - pd.Timestamp(0, tz='UTC')) // pd.Timedelta(seconds=1)).to_numpy(dtype=np.int64)
+    prices = pd.to_numeric(df[price_column], errors='coerce').to_numpy(dtype=np.float64)
+
+    valid = ~np.isnan(prices)
+    timestamps, prices = timestamps[valid], prices[valid]
+    order = np.argsort(timestamps, kind='stable')
+    timestamps, prices = timestamps[order], prices[order]
+    # Keep the last row for repeated timestamps
+    keep = np.append(timestamps[1:] != timestamps[:-1], True) if len(timestamps) else np.array([], dtype=bool)
+    return PriceSeries(timestamps[keep], prices[keep])
+
+
+# Process-wide cache of price series, one file per symbol (ETH.csv, USDC.parquet, ...).
+# A series is reloaded when its file changes on disk.
+class PriceStore:
+    def __init__(self, data_dir=PRICE_DATA_DIR):
+        self.data_dir = data_dir
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def _find_file(self, symbol):
+        for extension in PRICE_FILE_EXTENSIONS:
+            path = os.path.join(self.data_dir, f"{symbol.upper()}{extension}")
+            if os.path.exists(path):
+                return path
+        return None
+
+    def get_series(self, symbol):
+        path = self._find_file(symbol)
+        if path is None:
+            return None
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+
+        cached = self._series.get(symbol.upper())
+        if cached is not None and cached[0] == (path, mtime):
+            return cached[1]
+
+        with self._lock:
+            cached = self._series.get(symbol.upper())
+            if cached is not None and cached[0] == (path, mtime):
+                return cached[1]
+            try:
+                series = load_price_series(path)
+            except (OSError, ValueError, ImportError) as e:
+                logger.error(f"Error loading price history {path}: {e}")
+                return cached[1] if cached else None
+            self._series[symbol.upper()] = ((path, mtime), series)
+            logger.debug(f"Loaded {len(series)} {symbol.upper()} prices from {path}")
+            return series
+
+    def price_at(self, symbol, timestamp):
+        series = self.get_series(symbol)
+        return series.price_at(timestamp) if series is not None else None
+
+    # Batch lookup; an all-NaN array when there is no history for the symbol
+    def prices_at(self, symbol, timestamps):
+        series = self.get_series(symbol)
+        if series is None:
+            return np.full(len(timestamps), np.nan)
+        return series.prices_at(timestamps)
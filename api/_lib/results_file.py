@@ -0,0 +1,63 @@
+import io
+import os
+import csv
+import gzip
+import tempfile
+
+RESULT_FIELDS = ['address', 'status', 'description']
+# Results stay in memory up to this size, then spill to a temp file on disk
+RESULTS_SPOOL_SIZE = int(os.getenv('RESULTS_SPOOL_SIZE', str(8 * 1024 * 1024)))
+# Resumable upload chunk size, must be a multiple of 256 KB for Cloud Storage
+RESULTS_UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+
+
+# Streaming CSV writer for screening results. Rows are escaped by the csv module
+# and appended to a spooled temp file (optionally gzip-compressed) as they arrive.
+class ResultsWriter:
+    def __init__(self, compress=False, fieldnames=RESULT_FIELDS, spool_size=RESULTS_SPOOL_SIZE):
+        self.compress = compress
+        self.fieldnames = fieldnames
+        self.rows = 0
+        self._file = tempfile.SpooledTemporaryFile(max_size=spool_size)
+        self._out = gzip.GzipFile(fileobj=self._file, mode='wb') if compress else self._file
+        self._write(lambda writer: writer.writeheader())
+
+    @property
+    def extension(self):
+        return '.csv.gz' if self.compress else '.csv'
+
+    @property
+    def content_type(self):
+        return 'application/gzip' if self.compress else 'text/csv'
+
+    def _write(self, fn):
+        buffer = io.StringIO()
+        fn(csv.DictWriter(buffer, fieldnames=self.fieldnames, extrasaction='ignore'))
+        self._out.write(buffer.getvalue().encode('utf-8'))
+
+    def write_rows(self, rows):
+        self._write(lambda writer: writer.writerows(rows))
+        self.rows += len(rows)
+
+    # Function to finish the output and return the file rewound for upload
+    def finish(self):
+        if self.compress:
+            self._out.close()
+        self._file.seek(0)
+        return self._file
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+# Function to upload a finished ResultsWriter in resumable chunks and return its public URL
+def upload_results(bucket, writer, filename):
+    blob = bucket.blob(filename, chunk_size=RESULTS_UPLOAD_CHUNK_SIZE)
+    blob.upload_from_file(writer.finish(), content_type=writer.content_type)
+    return blob.public_url
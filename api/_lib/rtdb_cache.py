@@ -0,0 +1,96 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+
+# How long a cached node is served before it is revalidated with its ETag
+RTDB_CACHE_FRESH_SECONDS = float(os.getenv('RTDB_CACHE_FRESH_SECONDS', '5'))
+# Query pages have no ETag, they expire after this long (or on a local write)
+RTDB_PAGE_TTL = float(os.getenv('RTDB_PAGE_TTL', '30'))
+RTDB_CACHE_MAX_ENTRIES = int(os.getenv('RTDB_CACHE_MAX_ENTRIES', '5000'))
+
+
+# Function to list the (key, value) children of an RTDB result, which the SDK
+# returns as a list for array-like nodes (integer keys) and a dict otherwise
+def node_items(value):
+    if isinstance(value, list):
+        return [(str(index), item) for index, item in enumerate(value) if item is not None]
+    if isinstance(value, dict):
+        return list(value.items())
+    return []
+
+
+# Function to sort RTDB keys the way order_by_key does: integer keys first, numerically
+def rtdb_key_order(key):
+    return (0, int(key), '') if key.isdigit() else (1, 0, key)
+
+
+# Per-path cache of Realtime Database reads. Whole nodes are revalidated with
+# ETag-conditional reads, so an unchanged node costs a round trip but no
+# payload; ordered/limited query pages are cached briefly by their parameters.
+# Writes made by this process should call invalidate(path).
+class RTDBCache:
+    def __init__(self, fresh_seconds=RTDB_CACHE_FRESH_SECONDS, page_ttl=RTDB_PAGE_TTL,
+                 max_entries=RTDB_CACHE_MAX_ENTRIES):
+        self.fresh_seconds = fresh_seconds
+        self.page_ttl = page_ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _lookup(self, key):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is not None:
+                self._entries.move_to_end(key)
+            return item
+
+    def _put(self, key, item):
+        with self._lock:
+            self._entries[key] = item
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    # Function to read a whole node, reusing the cached value while its ETag matches
+    def get(self, ref):
+        key = ('node', ref.path)
+        item = self._lookup(key)
+        now = time.monotonic()
+        if item is not None and now - item['checked_at'] < self.fresh_seconds:
+            return item['value']
+
+        if item is None:
+            value, etag = ref.get(etag=True)
+        else:
+            changed, value, etag = ref.get_if_changed(item['etag'])
+            if not changed:
+                value = item['value']
+        self._put(key, {'value': value, 'etag': etag, 'checked_at': now})
+        return value
+
+    # Function to read one page of children ordered by key: at most limit entries
+    # before the key `before` (or the newest ones), oldest first, plus whether
+    # older entries exist
+    def get_page(self, ref, limit, before=None):
+        key = ('page', ref.path, limit, before)
+        item = self._lookup(key)
+        now = time.monotonic()
+        if item is not None and now - item['checked_at'] < self.page_ttl:
+            return item['value']
+
+        query = ref.order_by_key()
+        if before is not None:
+            query = query.end_at(before)
+        # One extra entry tells whether there is an older page
+        items = node_items(query.limit_to_last(limit + 2 if before is not None else limit + 1).get())
+        items = sorted((item for item in items if item[0] != before), key=lambda item: rtdb_key_order(item[0]))
+        page = (items[-limit:] if limit else [], len(items) > limit)
+        self._put(key, {'value': page, 'checked_at': now})
+        return page
+
+    def invalidate(self, path):
+        path = path.rstrip('/')
+        with self._lock:
+            for key in [k for k in self._entries if k[1] == path or k[1].startswith(path + '/')]:
+                del self._entries[key]
@@ -0,0 +1,66 @@
+import threading
+from contextlib import contextmanager
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+# Request coalescing: concurrent callers asking for the same key share one
+# in-flight upstream call and its result (or its exception) instead of each
+# making their own. Nothing is kept once the call finishes; caching is left to
+# the layers above and below.
+class SingleFlight:
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def _join(self, key):
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                return call, False
+            call = self._calls[key] = _Call()
+            return call, True
+
+    def _finish(self, key, call):
+        with self._lock:
+            del self._calls[key]
+        call.done.set()
+
+    # Function to run fn(*args) once per key at a time; callers that arrive while
+    # it runs wait for it and get the same result
+    def do(self, key, fn, *args, **kwargs):
+        call, leader = self._join(key)
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            self._finish(key, call)
+
+    # Context manager for work that cannot be wrapped in one call, such as a
+    # generator: yields True to the caller that should do the work, and False to
+    # the others once that caller is done, so they can read what it left behind
+    @contextmanager
+    def lead(self, key):
+        call, leader = self._join(key)
+        if not leader:
+            call.done.wait()
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            self._finish(key, call)
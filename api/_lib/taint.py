@@ -0,0 +1,216 @@
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+TAINT_MAX_HOPS = int(os.getenv('TAINT_MAX_HOPS', '3'))
+# Nodes whose neighbors may be fetched in one trace
+TAINT_NODE_BUDGET = int(os.getenv('TAINT_NODE_BUDGET', '200'))
+# Nodes with more distinct counterparties (exchanges, routers) are not expanded
+TAINT_MAX_NEIGHBORS = int(os.getenv('TAINT_MAX_NEIGHBORS', '500'))
+# Transactions read per node; longer histories are scanned only this far
+TAINT_MAX_NODE_TRANSACTIONS = int(os.getenv('TAINT_MAX_NODE_TRANSACTIONS', '10000'))
+# Wall-clock limit of one trace; nodes not fetched by then are not expanded
+TAINT_DEADLINE_SECONDS = float(os.getenv('TAINT_DEADLINE_SECONDS', '20'))
+# Weight of a flagged address k hops away is TAINT_DECAY ** (k - 1)
+TAINT_DECAY = float(os.getenv('TAINT_DECAY', '0.5'))
+TAINT_MAX_PATHS = 10
+TAINT_CACHE_TTL = float(os.getenv('TAINT_CACHE_TTL', '300'))
+TAINT_CACHE_SIZE = int(os.getenv('TAINT_CACHE_SIZE', '10000'))
+
+# Mark a node whose neighbors could not be fetched, or were not fetched in time
+_FETCH_FAILED = object()
+_TIMED_OUT = object()
+
+
+# Small thread-safe TTL + LRU map for neighbor sets and finished traces
+class _TTLCache:
+    def __init__(self, ttl, max_entries):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            if time.monotonic() - item[0] >= self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return item[1]
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+# Bounded breadth-first search from a wallet to flagged addresses over the
+# counterparty graph. Every hop fetches the neighbors of the whole frontier in
+# parallel; nodes are visited once, flagged nodes and hubs are not expanded,
+# and the search stops at the hop limit, when the node budget is spent or at
+# the deadline. Each node's history is read up to max_node_transactions.
+# Neighbor sets and finished traces are cached, so hot nodes are fetched once.
+class TaintEngine:
+    def __init__(self, neighbors, pool, max_hops=TAINT_MAX_HOPS, node_budget=TAINT_NODE_BUDGET,
+                 max_neighbors=TAINT_MAX_NEIGHBORS, decay=TAINT_DECAY, max_paths=TAINT_MAX_PATHS,
+                 cache_ttl=TAINT_CACHE_TTL, cache_size=TAINT_CACHE_SIZE,
+                 max_node_transactions=TAINT_MAX_NODE_TRANSACTIONS, deadline_seconds=TAINT_DEADLINE_SECONDS):
+        # neighbors(address, limit, max_transactions) returns (counterparties, complete):
+        # the set of lowercase counterparties, or None when the address has more
+        # than limit of them, and whether the whole history was read
+        self.neighbors = neighbors
+        self.pool = pool
+        self.max_hops = max_hops
+        self.node_budget = node_budget
+        self.max_neighbors = max_neighbors
+        self.max_node_transactions = max_node_transactions
+        self.deadline_seconds = deadline_seconds
+        self.decay = decay
+        self.max_paths = max_paths
+        self._neighbor_cache = _TTLCache(cache_ttl, cache_size)
+        self._trace_cache = _TTLCache(cache_ttl, cache_size)
+
+    # Function to return (neighbors, complete) for a node, where neighbors is
+    # False for hubs, or one of the _FETCH_FAILED / _TIMED_OUT markers
+    def _cached_neighbors(self, address, deadline):
+        cached = self._neighbor_cache.get(address)
+        if cached is not None:
+            return cached
+        if time.monotonic() >= deadline:
+            return _TIMED_OUT
+        try:
+            neighbors, complete = self.neighbors(address, self.max_neighbors, self.max_node_transactions)
+        except Exception as e:
+            # A failed fetch prunes this branch for this trace only and is not cached
+            logger.error(f"Error fetching counterparties of {address}: {e}")
+            return _FETCH_FAILED
+        # Hubs are cached as False so they are not refetched
+        result = (False if neighbors is None else neighbors, complete)
+        self._neighbor_cache.put(address, result)
+        return result
+
+    def trace(self, address, address_index, max_hops=None, node_budget=None):
+        max_hops = self.max_hops if max_hops is None else max_hops
+        node_budget = self.node_budget if node_budget is None else node_budget
+        start = address.lower()
+        key = (start, max_hops, node_budget, address_index.signature)
+        result = self._trace_cache.get(key)
+        if result is None:
+            result = self._search(start, address_index, max_hops, node_budget)
+            # An incomplete trace may be a false negative, so it is retried next time
+            if not result['fetch_errors'] and not result['timed_out']:
+                self._trace_cache.put(key, result)
+        return dict(result, address=address)
+
+    def _search(self, start, address_index, max_hops, node_budget):
+        depth = {start: 0}
+        parents = {start: []}
+        hits = {}
+        hubs = 0
+        errors = 0
+        partial = 0
+        timed_out = False
+        expanded = 0
+        truncated = False
+        deadline = time.monotonic() + self.deadline_seconds
+
+        entity = address_index.lookup(start)
+        if entity:
+            hits[start] = (0, entity)
+        frontier = [] if entity else [start]
+
+        for hop in range(1, max_hops + 1):
+            if not frontier:
+                break
+            budget_left = node_budget - expanded
+            if len(frontier) > budget_left:
+                frontier = frontier[:budget_left]
+                truncated = True
+            if not frontier:
+                break
+
+            neighbor_sets = list(self.pool.map(lambda node: self._cached_neighbors(node, deadline), frontier))
+            expanded += len(frontier)
+            next_frontier = []
+            for node, fetched in zip(frontier, neighbor_sets):
+                if fetched is _FETCH_FAILED:
+                    errors += 1
+                    continue
+                if fetched is _TIMED_OUT:
+                    timed_out = True
+                    continue
+                neighbors, complete = fetched
+                partial += not complete
+                if not neighbors:
+                    hubs += neighbors is False
+                    continue
+                for neighbor in neighbors:
+                    seen_at = depth.get(neighbor)
+                    if seen_at is None:
+                        depth[neighbor] = hop
+                        parents[neighbor] = [node]
+                        entity = address_index.lookup(neighbor)
+                        if entity:
+                            hits[neighbor] = (hop, entity)
+                        else:
+                            next_frontier.append(neighbor)
+                    elif seen_at == hop:
+                        # Another shortest way to the same node
+                        parents[neighbor].append(node)
+            frontier = next_frontier
+
+        return self._summarize(depth, parents, hits, expanded, hubs, errors, partial, timed_out,
+                               truncated or errors > 0 or partial > 0 or timed_out)
+
+    def _paths_to(self, node, parents):
+        # Walk parent links back to the start, stopping at max_paths paths
+        paths = []
+        stack = [(node, [node])]
+        while stack and len(paths) < self.max_paths:
+            current, path = stack.pop()
+            if not parents[current]:
+                paths.append(path[::-1])
+                continue
+            for parent in parents[current]:
+                stack.append((parent, path + [parent]))
+        return paths
+
+    def _summarize(self, depth, parents, hits, expanded, hubs, errors, partial, timed_out, truncated):
+        # Independent exposures combine like probabilities: 1 - prod(1 - weight)
+        clean = 1.0
+        for hops, _ in hits.values():
+            clean *= 1 - min(1.0, self.decay ** max(hops - 1, 0))
+        nearest = min((hops for hops, _ in hits.values()), default=None)
+
+        paths = []
+        for node, (hops, _) in sorted(hits.items(), key=lambda item: item[1][0]):
+            if hops != nearest or len(paths) >= self.max_paths:
+                break
+            paths.extend(self._paths_to(node, parents)[:self.max_paths - len(paths)])
+
+        return {
+            'tainted': bool(hits),
+            'score': round(1 - clean, 6),
+            'hops': nearest,
+            'shortest_paths': paths,
+            'flagged_hits': [
+                {'address': node, 'hops': hops, 'root': entity.root, 'category': entity.category}
+                for node, (hops, entity) in sorted(hits.items(), key=lambda item: (item[1][0], item[0]))
+            ],
+            'nodes_expanded': expanded,
+            'nodes_seen': len(depth),
+            'hubs_skipped': hubs,
+            'fetch_errors': errors,
+            'partial_scans': partial,
+            'timed_out': timed_out,
+            'truncated': truncated
+        }
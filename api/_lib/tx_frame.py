@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+
+# Address-like columns are stored as categoricals: wallets repeat the same few
+# counterparties, so comparisons and lowercasing run once per distinct address
+NUMERIC_COLUMNS = ('value', 'gasPrice', 'timeStamp')
+
+
+# Columnar view of a transaction list, built once and shared by every metric.
+# Only the columns a metric asks for are extracted, each in a single pass.
+class TransactionFrame:
+    def __init__(self, transactions, address=None):
+        self.address = address
+        self.transactions = transactions if isinstance(transactions, list) else list(transactions)
+        self._columns = {}
+
+    def __len__(self):
+        return len(self.transactions)
+
+    # Like tx[name] for every transaction: a missing key raises KeyError and a
+    # non-numeric value in a numeric column raises ValueError
+    def column(self, name):
+        if name not in self._columns:
+            raw = [tx[name] for tx in self.transactions]
+            if name in NUMERIC_COLUMNS:
+                series = pd.Series(np.array(raw, dtype=np.float64) if raw else np.empty(0, dtype=np.float64))
+            else:
+                series = pd.Series(pd.Categorical(raw))
+            self._columns[name] = series
+        return self._columns[name]
+
+    # Lowercased categorical column; the string work is done once per category
+    def lower(self, name):
+        key = f"{name}.lower"
+        if key not in self._columns:
+            categorical = self.column(name).cat
+            categories = np.array([str(c).lower() for c in categorical.categories] + [''], dtype=object)
+            codes = categorical.codes.to_numpy()
+            self._columns[key] = pd.Series(pd.Categorical(categories[codes]))
+        return self._columns[key]
+
+    @property
+    def values(self):
+        return self.column('value')
+
+    def sent_mask(self, case_sensitive=True):
+        if case_sensitive:
+            return (self.column('from') == self.address).to_numpy()
+        return (self.lower('from') == str(self.address).lower()).to_numpy()
+
+    def received_mask(self, case_sensitive=True):
+        if case_sensitive:
+            return (self.column('to') == self.address).to_numpy()
+        return (self.lower('to') == str(self.address).lower()).to_numpy()
+
+
+# Function to count occurrences of each value of a categorical column as a plain dict
+def value_counts(series):
+    counts = series.value_counts(sort=False)
+    return {key: int(count) for key, count in counts.items() if count}
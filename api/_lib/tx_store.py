@@ -0,0 +1,234 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import tempfile
+import threading
+from api._lib.etherscan import record_key, stable_record
+
+logger = logging.getLogger(__name__)
+
+TX_STORE_FILENAME = 'transactions.sqlite3'
+TX_STORE_PAGE_SIZE = 10000
+# Bumped when stored rows need rewriting; kept in PRAGMA user_version
+TX_STORE_SCHEMA_VERSION = 1
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS transactions (
+    id INTEGER PRIMARY KEY,
+    address TEXT NOT NULL,
+    action TEXT NOT NULL,
+    block INTEGER NOT NULL,
+    counterparty TEXT,
+    record_hash TEXT NOT NULL,
+    data TEXT NOT NULL,
+    UNIQUE (address, action, record_hash)
+);
+CREATE INDEX IF NOT EXISTS transactions_address_block ON transactions (address, action, block);
+CREATE INDEX IF NOT EXISTS transactions_counterparty ON transactions (counterparty, address);
+CREATE TABLE IF NOT EXISTS sync_state (
+    address TEXT NOT NULL,
+    action TEXT NOT NULL,
+    last_block INTEGER NOT NULL,
+    synced_at REAL NOT NULL,
+    PRIMARY KEY (address, action)
+);
+CREATE TABLE IF NOT EXISTS wallet_metrics (
+    address TEXT PRIMARY KEY,
+    metrics TEXT NOT NULL,
+    capital_gains REAL,
+    updated_at REAL NOT NULL
+);
+'''
+
+
+# Function to pick the store location: TX_STORE_PATH, else api/data/ when it is
+# writable, else the temp dir (the deployed filesystem is read-only outside /tmp)
+def default_store_path():
+    path = os.getenv('TX_STORE_PATH')
+    if path:
+        return path
+    data_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data')
+    try:
+        os.makedirs(data_dir, exist_ok=True)
+        if os.access(data_dir, os.W_OK):
+            return os.path.join(data_dir, TX_STORE_FILENAME)
+    except OSError:
+        pass
+    return os.path.join(tempfile.gettempdir(), TX_STORE_FILENAME)
+
+
+# Function to find the other side of a transaction relative to the stored address
+def counterparty_of(address, tx):
+    sender = str(tx.get('from', '')).lower()
+    if sender != address:
+        return sender or None
+    return str(tx.get('to') or tx.get('contractAddress') or '').lower() or None
+
+
+# Function to hash a record's identity, which leaves out volatile fields like confirmations
+def record_hash(tx):
+    return hashlib.sha1(json.dumps(record_key(tx)).encode('utf-8')).hexdigest()
+
+
+class SyncState:
+    __slots__ = ('last_block', 'synced_at')
+
+    def __init__(self, last_block, synced_at):
+        self.last_block = last_block
+        self.synced_at = synced_at
+
+
+# Durable per-address store of Etherscan account lists (txlist, txlistinternal,
+# tokentx), keyed by address and block and indexed by counterparty. Records are
+# inserted idempotently on their stable fields (confirmations is dropped), so
+# overlapping or repeated syncs never duplicate rows.
+# Each thread gets its own connection; WAL lets readers run alongside a writer.
+class TransactionStore:
+    def __init__(self, path=None):
+        self.path = path or default_store_path()
+        self._local = threading.local()
+        conn = self._connect()
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+        exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'transactions'").fetchone()
+        if exists and version < TX_STORE_SCHEMA_VERSION:
+            self._migrate(conn)
+        conn.executescript(SCHEMA)
+        conn.execute(f'PRAGMA user_version = {TX_STORE_SCHEMA_VERSION}')
+
+    # Function to rewrite rows stored before volatile fields were dropped: their
+    # hashes included confirmations, so re-syncs stored the same record again
+    def _migrate(self, conn):
+        logger.info(f"Migrating transaction store {self.path} to schema version {TX_STORE_SCHEMA_VERSION}")
+        conn.execute('DROP INDEX IF EXISTS transactions_address_block')
+        conn.execute('DROP INDEX IF EXISTS transactions_counterparty')
+        conn.execute('ALTER TABLE transactions RENAME TO transactions_old')
+        conn.executescript(SCHEMA)
+        cursor = conn.execute('SELECT address, action, block, counterparty, data FROM transactions_old ORDER BY id')
+        while True:
+            rows = cursor.fetchmany(TX_STORE_PAGE_SIZE)
+            if not rows:
+                break
+            records = [(row, stable_record(json.loads(row[4]))) for row in rows]
+            # Rows are copied oldest first, so the first copy of a duplicate is kept
+            conn.executemany(
+                'INSERT OR IGNORE INTO transactions (address, action, block, counterparty, record_hash, data) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                [(address, action, block, counterparty, record_hash(tx), json.dumps(tx, separators=(',', ':')))
+                 for (address, action, block, counterparty, _), tx in records]
+            )
+        conn.execute('DROP TABLE transactions_old')
+        conn.commit()
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def get_state(self, address, action):
+        row = self._connect().execute(
+            'SELECT last_block, synced_at FROM sync_state WHERE address = ? AND action = ?',
+            (address.lower(), action)
+        ).fetchone()
+        return SyncState(*row) if row else None
+
+    # Generator over the stored history in block order, one page (list) at a time
+    def iter_pages(self, address, action, page_size=TX_STORE_PAGE_SIZE):
+        cursor = self._connect().execute(
+            'SELECT data FROM transactions WHERE address = ? AND action = ? ORDER BY block, id',
+            (address.lower(), action)
+        )
+        while True:
+            rows = cursor.fetchmany(page_size)
+            if not rows:
+                return
+            yield [json.loads(data) for (data,) in rows]
+
+    def append(self, address, action, transactions):
+        address = address.lower()
+        transactions = [stable_record(tx) for tx in transactions]
+        rows = [
+            (address, action, int(tx.get('blockNumber', 0)), counterparty_of(address, tx), record_hash(tx),
+             json.dumps(tx, separators=(',', ':')))
+            for tx in transactions
+        ]
+        with self._connect() as conn:
+            conn.executemany(
+                'INSERT OR IGNORE INTO transactions (address, action, block, counterparty, record_hash, data) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                rows
+            )
+
+    # Function to record that the history is complete up to last_block
+    def mark_synced(self, address, action, last_block):
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT INTO sync_state (address, action, last_block, synced_at) VALUES (?, ?, ?, ?) '
+                'ON CONFLICT (address, action) DO UPDATE SET '
+                'last_block = MAX(last_block, excluded.last_block), synced_at = excluded.synced_at',
+                (address.lower(), action, last_block, time.time())
+            )
+
+    # Function to drop rows past the sync point, left by a fetch that did not finish
+    def discard_unsynced(self, address, action):
+        state = self.get_state(address, action)
+        with self._connect() as conn:
+            conn.execute(
+                'DELETE FROM transactions WHERE address = ? AND action = ? AND block > ?',
+                (address.lower(), action, state.last_block if state else -1)
+            )
+
+    def last_row_id(self):
+        return self._connect().execute('SELECT COALESCE(MAX(id), 0) FROM transactions').fetchone()[0]
+
+    # Function to read the distinct (address, counterparty) links of rows in (after_id, up_to_id]
+    def iter_links(self, after_id=0, up_to_id=None):
+        if up_to_id is None:
+            up_to_id = self.last_row_id()
+        return self._connect().execute(
+            'SELECT DISTINCT address, counterparty FROM transactions '
+            'WHERE id > ? AND id <= ? AND counterparty IS NOT NULL',
+            (after_id, up_to_id)
+        )
+
+    # Function to count the stored wallets that have transacted with counterparty
+    def counterparty_reach(self, counterparty):
+        return self._connect().execute(
+            'SELECT COUNT(DISTINCT address) FROM transactions WHERE counterparty = ?', (counterparty.lower(),)
+        ).fetchone()[0]
+
+    # Function to list which of the given addresses have a stored history
+    def synced_addresses(self, addresses, action='txlist'):
+        addresses = list({address.lower() for address in addresses})
+        synced = set()
+        conn = self._connect()
+        # Stay under SQLite's bound parameter limit
+        for start in range(0, len(addresses), 500):
+            chunk = addresses[start:start + 500]
+            rows = conn.execute(
+                f"SELECT address FROM sync_state WHERE action = ? AND address IN ({','.join('?' * len(chunk))})",
+                [action, *chunk]
+            )
+            synced.update(address for (address,) in rows)
+        return synced
+
+    def save_metrics(self, address, metrics, capital_gains):
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO wallet_metrics (address, metrics, capital_gains, updated_at) VALUES (?, ?, ?, ?)',
+                (address.lower(), json.dumps(metrics), capital_gains, time.time())
+            )
+
+    def get_metrics(self, address):
+        row = self._connect().execute(
+            'SELECT metrics, capital_gains, updated_at FROM wallet_metrics WHERE address = ?', (address.lower(),)
+        ).fetchone()
+        if row is None:
+            return None
+        return {'metrics': json.loads(row[0]), 'capital_gains': row[1], 'updated_at': row[2]}
@@ -6,14 +6,41 @@ import re
 import json
 import threading
 import time
-from flask import Flask, request, jsonify, send_file, url_for, make_response
+import tempfile
+import sqlite3
+from contextlib import closing
+from decimal import Decimal
+from itertools import chain
+from collections import Counter, OrderedDict
+from flask import Flask, request, jsonify, send_file, url_for, make_response, g
 import firebase_admin
 from firebase_admin import credentials, db, auth, initialize_app, storage
 from dotenv import load_dotenv
-import pandas as pd
+import numpy as np
 from flask_cors import CORS
-from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
 import requests
+from api._lib.address_index import AddressIndexLoader
+from api._lib.etherscan import EtherscanClient
+from api._lib.history_cache import HistoryCache
+from api._lib.tx_store import TransactionStore
+from api._lib.exposure import ExposureIndex
+from api._lib.taint import TaintEngine, TAINT_MAX_HOPS, TAINT_NODE_BUDGET
+from api._lib.genai import GenAIClient, GenAIError, AddressInsights
+from api._lib.contract_analysis import ContractAnalyzer
+from api._lib.auth import TokenVerifier, require_auth
+from api._lib.rtdb_cache import RTDBCache, node_items
+from api._lib.singleflight import SingleFlight
+from api._lib.batch import run_batch
+from api._lib.jobs import JobManager
+from api._lib.ingest import iter_chunks, iter_upload_addresses
+from api._lib.results_file import ResultsWriter, upload_results
+from api._lib.tx_frame import TransactionFrame, value_counts
+from api._lib.lots import FIFO, MATCHING_METHODS, LotLedger, serialize_realized_gain, to_wei
+from api._lib.prices import PriceStore
+from api._lib.detectors import (
+    DETECTORS, create_detectors, run_detectors, run_frame_detector
+)
 
 load_dotenv()
 app = Flask(__name__)
@@ -51,6 +78,20 @@ except Exception as e:
 database = db.reference()
 bucket = storage.bucket()
 
+# Per-path cache of RTDB reads, revalidated with ETags
+rtdb_cache = RTDBCache()
+UPLOAD_HISTORY_PAGE_SIZE = 50
+UPLOAD_HISTORY_MAX_PAGE_SIZE = 500
+
+# Firebase ID tokens are verified locally against cached Google signing keys
+token_verifier = TokenVerifier(cred.project_id)
+login_required = require_auth(token_verifier)
+
+# Function to verify a Firebase ID token (optionally prefixed with "Bearer "),
+# returning its claims with 'uid' or None when it is invalid
+def verify_api_token(token):
+    return token_verifier.verify(token)
+
 # Define Coinbase origin address
 COINBASE_ORIGIN_ADDRESS = '0xa9d1e08c7793af67e9d92fe308d5697fb81d3e43'
 
@@ -63,99 +104,124 @@ OPENAI_API_KEY = os.getenv('NEXT_PUBLIC_OPENAI_API_KEY')
 
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 
-# Function to load flagged addresses from a JSON file
-def load_flagged_addresses():
-    flagged_addresses = {}
-    if os.path.exists(FLAGGED_JSON_PATH):
-        with open(FLAGGED_JSON_PATH, 'r') as f:
-            flagged_addresses = json.load(f)
-    return flagged_addresses
-
-# Function to recursively check if an address is flagged or part of flagged nested addresses
-def is_address_flagged(address, flagged_addresses):
-    address_lower = address.lower()
-    if address_lower in flagged_addresses:
-        return True
-    for nested_list in flagged_addresses.values():
-        if address_lower in [addr.lower() for addr in nested_list]:
-            return True
-    return False
-
-# Function to load unique addresses from JSON files
-def load_unique_addresses():
-    unique_addresses = set()
-    for filename in os.listdir(UNIQUE_DIR):
-        if filename.endswith('.json'):
-            filepath = os.path.join(UNIQUE_DIR, filename)
-            with open(filepath, 'r') as f:
-                data = json.load(f)
-                for address in data:
-                    unique_addresses.add(address.lower())
-    return unique_addresses
+# Pooled, rate-limited Etherscan client shared by all request threads
+etherscan = EtherscanClient(ETHERSCAN_API_KEY)
+# Durable local copy of fetched histories; the service still works without it
+try:
+    tx_store = TransactionStore()
+except (sqlite3.Error, OSError) as e:
+    logger.error(f"Transaction store unavailable, histories will not be persisted: {e}")
+    tx_store = None
+# Per-address account histories, refreshed incrementally once their TTL expires
+history_cache = HistoryCache(etherscan, store=tx_store)
+# Threads for independent upstream fetches; the shared rate limiter still applies
+fetch_pool = ThreadPoolExecutor(max_workers=int(os.getenv('ETHERSCAN_FETCH_WORKERS', '8')), thread_name_prefix='etherscan')
+
+# Function to run independent fetches concurrently so latency is the slowest call, not the sum
+def fetch_concurrently(*calls):
+    futures = [fetch_pool.submit(fn, *args) for fn, *args in calls]
+    return [future.result() for future in futures]
+
+# Chat completions client and the cached per-address insights built on it
+genai_client = GenAIClient(OPENAI_API_KEY)
+address_insights = AddressInsights(genai_client)
+contract_analyzer = ContractAnalyzer(genai_client)
+
+# Historical prices (api/prices/ETH.csv, ...) loaded once and kept in memory across requests
+price_store = PriceStore()
+
+# Background workers for async file uploads; uploads are read and screened in chunks of this size
+upload_jobs = JobManager()
+UPLOAD_JOB_CHUNK_SIZE = int(os.getenv('UPLOAD_JOB_CHUNK_SIZE', '100'))
+# Addresses remembered for skipping repeats across chunks; older ones may be screened again
+UPLOAD_DEDUP_WINDOW = int(os.getenv('UPLOAD_DEDUP_WINDOW', '100000'))
+# Stored result files are streamed to clients in chunks of this size
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Sanctions/mixer lists are parsed once per process and swapped atomically when they change on disk
+address_index_loader = AddressIndexLoader(UNIQUE_DIR, FLAGGED_JSON_PATH)
+address_index_loader.get()
+# Reverse index from flagged addresses to the stored wallets that transacted with them
+exposure_index = ExposureIndex(tx_store, address_index_loader) if tx_store is not None else None
+
+# Function to check if an address is flagged or part of flagged nested addresses
+def is_address_flagged(address, address_index):
+    return address_index.find_flagged_root(address) is not None
 
 # Function to check wallet address against unique addresses and flagged addresses
-def check_wallet_address(wallet_address, unique_addresses, flagged_addresses):
+def check_wallet_address(wallet_address, address_index):
     wallet_address_lower = wallet_address.lower()
     description = 'Not Flagged'
 
-    if is_address_flagged(wallet_address, flagged_addresses):
+    if is_address_flagged(wallet_address, address_index):
         description = 'Flagged: Wallet address found to be involved in mixer related activities'
-    elif wallet_address_lower in unique_addresses:
+    elif wallet_address_lower in address_index.unique_addresses:
         description = 'Flagged: Wallet address found in OFAC sanction list'
     return description
 
-def get_etherscan_details(wallet_address, unique_addresses):
-    try:
-        details = []
-
-        def fetch_transactions(url):
-            response = requests.get(url)
-            if response.status_code == 200:
-                data = response.json()
-                return data.get('result', [])
-            return []
-
-        # Regular transactions
-        regular_tx_url = (
-            f'https://api.etherscan.io/api?module=account&action=txlist&address={wallet_address}&apikey={ETHERSCAN_API_KEY}'
-        )
-        regular_transactions = fetch_transactions(regular_tx_url)
-
-        # Internal transactions
-        internal_tx_url = (
-            f'https://api.etherscan.io/api?module=account&action=txlistinternal&address={wallet_address}&apikey={ETHERSCAN_API_KEY}'
+# Function to screen one address, adding Etherscan details when it fails the list check
+def screen_address(address, address_index):
+    description = check_wallet_address(address, address_index)
+    status = 'Pass' if 'Not Flagged' in description else 'Fail'
+    if status == 'Fail':
+        description += get_etherscan_details(address, address_index)
+    return {'address': address, 'status': status, 'description': description}
+
+# Function to render the first sanctioned-address interaction of each transaction type
+def format_etherscan_details(details):
+    if details:
+        formatted_details = "\n".join(
+            [f"Involved in {tx['transaction_type']} Mixer/Tornado transaction with {tx['to']}\n"
+             f"Transaction Hash: {tx['transaction_hash']}\n"
+             f"From: {tx['from']}\n"
+             f"To: {tx['to']}\n"
+             f"Etherscan URL: {tx['etherscan_url']}\n"
+             for tx in details]
         )
-        internal_transactions = fetch_transactions(internal_tx_url)
-
-        # Function to process transactions
-        def process_transactions(transactions, tx_type):
-            for tx in transactions:
-                if tx['to'].lower() in unique_addresses or tx['from'].lower() in unique_addresses:
-                    details.append({
-                        'transaction_type': tx_type,
-                        'transaction_hash': tx['hash'],
-                        'from': tx['from'],
-                        'to': tx['to'],
-                        'etherscan_url': f"https://etherscan.io/tx/{tx['hash']}"
-                    })
-                    break  # Stop searching on first match
-
-        # Process both regular and internal transactions
-        process_transactions(regular_transactions, 'Regular')
-        process_transactions(internal_transactions, 'Internal')
-
-        if details:
-            formatted_details = "\n".join(
-                [f"Involved in {tx['transaction_type']} Mixer/Tornado transaction with {tx['to']}\n"
-                 f"Transaction Hash: {tx['transaction_hash']}\n"
-                 f"From: {tx['from']}\n"
-                 f"To: {tx['to']}\n"
-                 f"Etherscan URL: {tx['etherscan_url']}\n"
-                 for tx in details]
-            )
-            return formatted_details
-        else:
-            return "No relevant transactions found."
+        return formatted_details
+    else:
+        return "No relevant transactions found."
+
+# Function to stream one history through a set of detectors as its pages arrive
+def scan_history(action, wallet_address, detectors):
+    return run_detectors(history_cache.iter_pages(action, wallet_address), detectors)
+
+# Function to run the wallet's histories through the detector pipeline. Each
+# history is fetched once and scanned once for every detector reading it, and
+# the histories are scanned concurrently; internal transactions only feed the
+# sanctioned-interaction check.
+def scan_wallet_history(wallet_address, address_index, detector_names=()):
+    token_detectors = [name for name in detector_names if DETECTORS[name].source == 'tokentx']
+    regular_detectors = [name for name in detector_names if name not in token_detectors]
+
+    context = {
+        'address': wallet_address,
+        'address_index': address_index,
+        'sender_reach': tx_store.counterparty_reach if tx_store is not None else None
+    }
+    scans = [
+        (scan_history, 'txlist', wallet_address,
+         create_detectors(['unique_interaction', *regular_detectors], dict(context, tx_type='Regular'))),
+        (scan_history, 'txlistinternal', wallet_address,
+         create_detectors(['unique_interaction'], dict(context, tx_type='Internal')))
+    ]
+    if token_detectors:
+        scans.append((scan_history, 'tokentx', wallet_address, create_detectors(token_detectors, context)))
+    regular, internal, *token = fetch_concurrently(*scans)
+
+    details = [match for match in (regular.pop('unique_interaction'), internal['unique_interaction']) if match]
+    if token:
+        regular.update(token[0])
+    return details, regular
+
+# Concurrent screenings of the same address share one scan
+etherscan_details_flights = SingleFlight()
+
+def get_etherscan_details(wallet_address, address_index):
+    try:
+        key = (wallet_address.lower(), address_index.signature)
+        details, _ = etherscan_details_flights.do(key, scan_wallet_history, wallet_address, address_index)
+        return format_etherscan_details(details)
 
     except Exception as e:
         logger.error(f"Error fetching data from Etherscan API: {e}")
@@ -168,19 +234,13 @@ def log_request_info():
 
 # Endpoint for fetching all API tokens associated with the user
 @app.route('/api/get_all_tokens', methods=['GET'])
+@login_required
 def get_all_tokens():
-    token = request.headers.get('Authorization')
-    if not token:
-        return jsonify({'error': 'Token required'}), 401
-    decoded_token = verify_api_token(token)
-    if not decoded_token:
-        return jsonify({'error': 'Invalid token'}), 401
-
-    uid = decoded_token['uid']
+    uid = g.user['uid']
     api_tokens_ref = database.child('apiTokens').child(uid)
-    all_tokens = api_tokens_ref.get()
+    all_tokens = rtdb_cache.get(api_tokens_ref)
     if all_tokens:
-        tokens_list = list(all_tokens.values())
+        tokens_list = [token for _, token in node_items(all_tokens)]
         return jsonify({'tokens': tokens_list}), 200
     else:
         return jsonify({'tokens': []}), 200
@@ -208,13 +268,8 @@ def get_api_key():
 
 # Protected API endpoint (requires authentication)
 @app.route('/api/protected_endpoint', methods=['GET'])
+@login_required
 def protected_endpoint():
-    token = request.headers.get('Authorization')
-    if not token:
-        return jsonify({'error': 'Token required'}), 401
-    decoded_token = verify_api_token(token)
-    if not decoded_token:
-        return jsonify({'error': 'Invalid token'}), 401
     # Perform actions for the protected endpoint
     return jsonify({'message': 'Access granted'})
 
@@ -225,19 +280,20 @@ def check_wallet_address_endpoint():
         if not address:
             return jsonify({'error': 'Address parameter is required'}), 400
 
-        # Load unique addresses and flagged addresses
-        unique_addresses = load_unique_addresses()
-        flagged_addresses = load_flagged_addresses()
+        # Get the shared sanctions/mixer index
+        address_index = address_index_loader.get()
 
-        description = check_wallet_address(address, unique_addresses, flagged_addresses)
+        description = check_wallet_address(address, address_index)
         status = 'Pass' if 'Not Flagged' in description else 'Fail'
         if status == 'Fail':
-            description += get_etherscan_details(address, unique_addresses)
+            description += get_etherscan_details(address, address_index)
+        flagged_entity = address_index.lookup(address)
 
         response_data = {
             'address': address,
             'status': status,
-            'description': description
+            'description': description,
+            'flagged_entity': flagged_entity._asdict() if flagged_entity else None
         }
 
         return jsonify(response_data)
@@ -248,43 +304,22 @@ def check_wallet_address_endpoint():
         if not addresses:
             return jsonify({'error': 'Addresses parameter is required'}), 400
 
-        # Load unique addresses and flagged addresses
-        unique_addresses = load_unique_addresses()
-        flagged_addresses = load_flagged_addresses()
-        results = []
+        # Get the shared sanctions/mixer index
+        address_index = address_index_loader.get()
 
-        for address in addresses:
-            description = check_wallet_address(address, unique_addresses, flagged_addresses)
+        def screen(address):
+            description = check_wallet_address(address, address_index)
             if 'Flagged' in description:
-                description += get_etherscan_details(address, unique_addresses)
-            results.append({'address': address, 'description': description})
+                description += get_etherscan_details(address, address_index)
+            return {'address': address, 'description': description}
 
-        # Call GenAI to analyze the results and get insights
-        prompt_content = {
-            "addresses": addresses,
-            "results": [result['description'] for result in results]
-        }
+        # Screen in parallel; repeated addresses share one lookup but keep their own row
+        results = [dict(result) for result in run_batch(addresses, screen)]
 
+        # GenAI insights per address, batched and cached by screening result
         try:
-            genai_response = requests.post(
-                'https://api.openai.com/v1/chat/completions',
-                headers={
-                    'Content-Type': 'application/json',
-                    'Authorization': f'Bearer {OPENAI_API_KEY}',
-                },
-                json={
-                    'model': 'gpt-3.5-turbo-0125',
-                    'messages': [{'role': 'system', 'content': f"Analyze the following Ethereum addresses: {prompt_content}"}]
-                }
-            )
-
-            if genai_response.status_code != 200:
-                return jsonify({'error': 'Failed to analyze with GenAI'}), 500
-
-            insights = genai_response.json()
-            for i, result in enumerate(results):
-                result['insights'] = insights['choices'][i]['message']['content']
-
+            for result, insight in zip(results, address_insights.analyze(results)):
+                result['insights'] = insight
         except Exception as e:
             logger.error(f"Error calling OpenAI API: {e}")
             return jsonify({'error': 'Failed to analyze with GenAI'}), 500
@@ -300,12 +335,11 @@ def check_multiple_addresses():
         if not addresses:
             return jsonify({'error': 'Addresses parameter is required'}), 400
 
-        unique_addresses = load_unique_addresses()
-        flagged_addresses = load_flagged_addresses()
+        address_index = address_index_loader.get()
         results = []
 
         for address in addresses:
-            description = check_wallet_address(address, unique_addresses, flagged_addresses)
+            description = check_wallet_address(address, address_index)
             status = 'Pass' if 'Not Flagged' in description else 'Fail'
             results.append({
                 'address': address,
@@ -337,34 +371,21 @@ def clean_and_validate_addresses(addresses):
     return cleaned_addresses
 
 
-def analyze_transactions_with_flagged_addresses(transactions, unique_addresses, flagged_addresses):
-    flagged_interactions = []
-    risky_transactions_count = 0
-    total_value = 0.0
-    dates_involved = set()
+def analyze_transactions_with_flagged_addresses(transactions, address_index):
+    return analyze_transaction_pages([transactions], address_index)
 
-    for tx in transactions:
-        # Check both sender and receiver addresses against flagged and unique addresses
-        from_flagged = is_address_flagged(tx['from'], flagged_addresses) or tx['from'].lower() in unique_addresses
-        to_flagged = is_address_flagged(tx['to'], flagged_addresses) or tx['to'].lower() in unique_addresses
-
-        # Consider transaction flagged if either address is flagged
-        if from_flagged or to_flagged:
-            flagged_interactions.append(tx)
-            risky_transactions_count += 1
-            total_value += float(tx['value'])
-            # Add date to the set of involved dates
-            date = datetime.datetime.fromtimestamp(int(tx['timeStamp'])).strftime('%Y-%m-%d')
-            dates_involved.add(date)
-
-    summary = {
-        'number_of_interactions_with_flagged_addresses': len(flagged_interactions),
-        'number_of_risky_transactions': risky_transactions_count,
-        'total_value': total_value,
-        'all_dates_involved': sorted(list(dates_involved))
-    }
+# Function to build the flagged-interaction summary one page of history at a time
+def analyze_transaction_pages(pages, address_index):
+    detectors = create_detectors(['flagged_summary'], {'address_index': address_index})
+    return run_detectors(pages, detectors)['flagged_summary']
 
-    return summary
+# Function to stream an address's transaction pages, or None when it has no history
+def iter_transaction_pages(address, action='txlist'):
+    pages = history_cache.iter_pages(action, address)
+    first_page = next(pages, None)
+    if first_page is None:
+        return None
+    return chain([first_page], pages)
 
 @app.route('/api/transaction_summary', methods=['GET', 'POST'])
 def transaction_summary():
@@ -372,20 +393,185 @@ def transaction_summary():
     if not address:
         return jsonify({'error': 'Address parameter is required'}), 400
 
-    # Load unique and flagged addresses
-    unique_addresses = load_unique_addresses()
-    flagged_addresses = load_flagged_addresses()
+    # Get the shared sanctions/mixer index
+    address_index = address_index_loader.get()
 
-    # Fetch transaction history
-    transactions = fetch_transactions(address)
-    if not transactions:
+    # Stream the transaction history page by page
+    pages = iter_transaction_pages(address)
+    if pages is None:
         return jsonify({'error': 'No transactions found'}), 404
 
     # Analyze transactions
-    summary = analyze_transactions_with_flagged_addresses(transactions, unique_addresses, flagged_addresses)
+    summary = analyze_transaction_pages(pages, address_index)
 
     return jsonify(summary)
     
+# Function to make sure a wallet's history is in the store, for exposure queries
+def sync_history(address):
+    try:
+        history_cache.get('txlist', address)
+        return True
+    except Exception as e:
+        logger.error(f"Error syncing history of {address}: {e}")
+        return False
+
+# Endpoint for portfolio-wide exposure: GET lists the stored wallets that transacted
+# with one flagged address, POST reports flagged counterparties for many wallets
+@app.route('/api/exposure', methods=['GET', 'POST'])
+def exposure_endpoint():
+    if exposure_index is None:
+        return jsonify({'error': 'Transaction store is not available'}), 503
+
+    if request.method == 'GET':
+        address = request.args.get('address')
+        if not address:
+            return jsonify({'error': 'Address parameter is required'}), 400
+        flagged_entity = address_index_loader.get().lookup(address)
+        return jsonify({
+            'address': address,
+            'flagged_entity': flagged_entity._asdict() if flagged_entity else None,
+            'wallets': exposure_index.wallets_exposed_to(address)
+        })
+
+    data = request.get_json() or {}
+    addresses = [address for address in data.get('addresses', []) if isinstance(address, str) and address]
+    if not addresses:
+        return jsonify({'error': 'Addresses parameter is required'}), 400
+
+    # Optionally fetch the histories the store does not hold yet before answering
+    if data.get('sync'):
+        synced = tx_store.synced_addresses(addresses)
+        missing = [address for address in addresses if address.lower() not in synced]
+        if missing:
+            run_batch(missing, sync_history)
+            exposure_index.refresh(force=True)
+
+    results = exposure_index.exposure(addresses)
+    return jsonify({
+        'results': results,
+        'exposed': sum(1 for result in results if result['exposed']),
+        'not_synced': sum(1 for result in results if not result['synced'])
+    })
+
+# Function to collect a wallet's distinct counterparties for taint tracing from
+# at most max_transactions of its history. Returns (counterparties, complete);
+# counterparties is None once there are more than limit of them (exchanges and
+# other hubs are not expanded). A scan stopped early is not kept in the store.
+def collect_counterparties(address, limit, max_transactions):
+    address = address.lower()
+    counterparties = set()
+    scanned = 0
+    with closing(history_cache.iter_pages('txlist', address)) as pages:
+        for page in pages:
+            for tx in page[:max_transactions - scanned]:
+                for side in (tx['from'], tx['to']):
+                    side = side.lower()
+                    if side and side != address:
+                        counterparties.add(side)
+            scanned += len(page)
+            if len(counterparties) > limit:
+                return None, True
+            if scanned >= max_transactions:
+                return counterparties, False
+    return counterparties, True
+
+# Multi-hop exposure search; neighbor fetches share the Etherscan fetch pool
+taint_engine = TaintEngine(collect_counterparties, fetch_pool)
+
+# Function to read an optional integer query parameter capped at maximum
+def bounded_int_arg(name, default, maximum):
+    value = request.args.get(name, type=int)
+    if value is None:
+        return default
+    return max(0, min(value, maximum))
+
+# Endpoint for k-hop taint: shortest paths from a wallet to flagged addresses and a decayed score
+@app.route('/api/taint', methods=['GET'])
+def taint_endpoint():
+    address = request.args.get('address')
+    if not address:
+        return jsonify({'error': 'Address parameter is required'}), 400
+
+    max_hops = bounded_int_arg('max_hops', TAINT_MAX_HOPS, TAINT_MAX_HOPS)
+    node_budget = bounded_int_arg('node_budget', TAINT_NODE_BUDGET, TAINT_NODE_BUDGET)
+    address_index = address_index_loader.get()
+    try:
+        return jsonify(taint_engine.trace(address, address_index, max_hops, node_budget))
+    except Exception as e:
+        logger.error(f"Error tracing taint for {address}: {e}")
+        return jsonify({'error': f'An error occurred: {e}'}), 500
+
+# Function to stream validated addresses out of an uploaded file in chunks.
+# Repeats are skipped within the last UPLOAD_DEDUP_WINDOW distinct addresses,
+# so memory stays bounded however large the file is.
+def iter_upload_address_chunks(file, filename, chunk_size, dedup_window=UPLOAD_DEDUP_WINDOW):
+    seen = OrderedDict()
+    for chunk in iter_chunks(iter_upload_addresses(file, filename), chunk_size):
+        addresses = []
+        for address in clean_and_validate_addresses(chunk):
+            if address in seen:
+                seen.move_to_end(address)
+                continue
+            seen[address] = None
+            if len(seen) > dedup_window:
+                seen.popitem(last=False)
+            addresses.append(address)
+        if addresses:
+            yield addresses
+
+# Function to name a results file after the current date/time
+def results_filename(writer, suffix=''):
+    current_date = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    return f"results_{current_date}{suffix}{writer.extension}"
+
+# Function to read a boolean flag from the query string or form data
+def request_flag(name):
+    return request.values.get(name, '').lower() in ('1', 'true', 'yes')
+
+# Function to append an entry to users/{uid}/upload_history, keeping the
+# array layout the firewall page writes (sequential integer keys)
+def append_upload_history(uid, entry):
+    history_ref = db.reference(f'users/{uid}/upload_history')
+    last = history_ref.order_by_key().limit_to_last(1).get()
+    if isinstance(last, list):
+        keys = [str(len(last) - 1)]
+    else:
+        keys = list(last.keys()) if last else []
+    if keys and not keys[-1].isdigit():
+        history_ref.push(entry)
+        rtdb_cache.invalidate(history_ref.path)
+        return
+
+    index = int(keys[-1]) + 1 if keys else 0
+    # Claim the next free slot; another writer may have taken it in between
+    while history_ref.child(str(index)).transaction(lambda current: entry if current is None else current) != entry:
+        index += 1
+    rtdb_cache.invalidate(history_ref.path)
+
+# Background upload job: screens rows in chunks so progress and partial results can be polled
+def process_upload_job(job, upload_path, filename, compress=False):
+    address_index = address_index_loader.get()
+    with ResultsWriter(compress) as writer:
+        try:
+            with open(upload_path, 'rb') as f:
+                for chunk in iter_upload_address_chunks(f, filename, UPLOAD_JOB_CHUNK_SIZE):
+                    results = run_batch(chunk, lambda address: screen_address(address, address_index))
+                    writer.write_rows(results)
+                    job.add_results(results)
+        finally:
+            os.remove(upload_path)
+        job.set_total(job.processed)
+
+        file_url = upload_results(bucket, writer, results_filename(writer, f"_{job.id}"))
+    if job.uid:
+        append_upload_history(job.uid, {
+            'fileUrl': file_url,
+            'timestamp': datetime.datetime.utcnow().isoformat() + 'Z',
+            'jobId': job.id,
+            'total': job.total
+        })
+    return file_url
+
 @app.route('/api/upload', methods=['POST'])
 def upload_file():
     if 'file' not in request.files:
@@ -396,51 +582,33 @@ def upload_file():
 
     if file and file.filename.endswith(('.csv', '.json')):
         try:
-            unique_addresses = load_unique_addresses()
-            flagged_addresses = load_flagged_addresses()
+            # Async mode: persist the upload, queue a job and return its id right away
+            if request_flag('async'):
+                fd, upload_path = tempfile.mkstemp(suffix=os.path.splitext(file.filename)[1])
+                with os.fdopen(fd, 'wb') as f:
+                    file.save(f)
+                # History is only written for the signed-in user the ID token proves
+                claims = verify_api_token(request.headers.get('Authorization'))
+                job = upload_jobs.submit(process_upload_job, upload_path, file.filename, request_flag('gzip'),
+                                         uid=claims['uid'] if claims else None)
+                return jsonify({
+                    'job_id': job.id,
+                    'status': job.status,
+                    'status_url': url_for('upload_status', job_id=job.id)
+                }), 202
+
+            # Sync mode returns every row in the response, so its memory grows with
+            # the file; large files should be sent with async=1
+            address_index = address_index_loader.get()
             results = []
-            data = {}
-
-            if file.filename.endswith('.csv'):
-                df = pd.read_csv(file)
-                for index, row in df.iterrows():
-                    data[row['address']] = None  # Only care about addresses for now
-
-            elif file.filename.endswith('.json'):
-                data = json.load(file)
-
-            addresses = [address for address in data.keys()]
-
-            # Clean and validate addresses
-            addresses = clean_and_validate_addresses(addresses)
-
-            for address in addresses:
-                description = check_wallet_address(address, unique_addresses, flagged_addresses)
-                status = 'Pass' if 'Not Flagged' in description else 'Fail'
-                if status == 'Fail':
-                    description += get_etherscan_details(address, unique_addresses)
-                results.append({'address': address, 'status': status, 'description': description})
-
-            # Convert results to CSV format
-            csv_content = 'address,status,description\n'
-            for result in results:
-                csv_content += '{},{},{}\n'.format(result['address'], result['status'], result['description'])
+            with ResultsWriter(request_flag('gzip')) as writer:
+                for chunk in iter_upload_address_chunks(file.stream, file.filename, UPLOAD_JOB_CHUNK_SIZE):
+                    chunk_results = run_batch(chunk, lambda address: screen_address(address, address_index))
+                    writer.write_rows(chunk_results)
+                    results.extend(chunk_results)
 
-            # Create BytesIO object to store CSV content
-            output = BytesIO()
-            output.write(csv_content.encode())
-            output.seek(0)
-
-            # Generate filename based on date/time and user UID
-            current_date = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-            filename = f"results_{current_date}.csv"
-
-            # Upload CSV to Firebase Storage
-            blob = bucket.blob(filename)
-            blob.upload_from_file(output, content_type='text/csv')
-
-            # Return URL to access the uploaded file
-            file_url = blob.public_url
+                # Upload the results file to Firebase Storage
+                file_url = upload_results(bucket, writer, results_filename(writer))
 
             # Prepare response with file download URL
             response = jsonify({
@@ -455,17 +623,83 @@ def upload_file():
     else:
         return jsonify({'error': 'Unsupported file type'}), 400
 
+# Endpoint for polling an async upload job; its latest results can be paged with offset/limit
+@app.route('/api/upload_status/<job_id>', methods=['GET'])
+def upload_status(job_id):
+    job = upload_jobs.get(job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+
+    try:
+        offset = max(0, int(request.args.get('offset', 0)))
+        limit = request.args.get('limit')
+        limit = max(0, int(limit)) if limit is not None else None
+    except ValueError:
+        return jsonify({'error': 'offset and limit must be integers'}), 400
+
+    return jsonify(job.to_dict(offset, limit))
+
 @app.route('/api/download/<filename>', methods=['GET'])
 def download_results(filename):
     try:
-        # Download file from Firebase Storage
-        blob = bucket.blob(filename)
-        content = blob.download_as_string()
+        # Fetch only the metadata here, the content is streamed in chunks below
+        blob = bucket.get_blob(filename)
+        if blob is None:
+            return jsonify({'error': f'File not found: {filename}'}), 404
+
+        size = blob.size
+        headers = {
+            'Content-Disposition': f'attachment; filename={filename}',
+            'Accept-Ranges': 'bytes'
+        }
+
+        # Conditional GET: clients holding the current version skip the transfer
+        not_modified = request.if_none_match.contains(blob.etag)
+        if not request.if_none_match and request.if_modified_since and blob.updated:
+            not_modified = blob.updated.replace(microsecond=0) <= request.if_modified_since
+        if not_modified:
+            response = make_response('', 304)
+            response.headers.update(headers)
+            response.set_etag(blob.etag)
+            return response
+
+        # Single byte ranges let clients resume; If-Range falls back to the full file when it changed
+        start, stop, status = 0, size, 200
+        byte_range = request.range
+        if_range = request.if_range
+        if if_range.etag is not None:
+            range_valid = if_range.etag == blob.etag
+        elif if_range.date is not None:
+            range_valid = blob.updated is not None and blob.updated.replace(microsecond=0) <= if_range.date
+        else:
+            range_valid = True
+        if byte_range and len(byte_range.ranges) == 1 and range_valid:
+            span = byte_range.range_for_length(size)
+            if span is None:
+                response = make_response('', 416)
+                response.headers['Content-Range'] = f'bytes */{size}'
+                return response
+            start, stop = span
+            status = 206
+
+        def generate():
+            with blob.open('rb', chunk_size=DOWNLOAD_CHUNK_SIZE) as reader:
+                reader.seek(start)
+                remaining = stop - start
+                while remaining > 0:
+                    chunk = reader.read(min(DOWNLOAD_CHUNK_SIZE, remaining))
+                    if not chunk:
+                        break
+                    remaining -= len(chunk)
+                    yield chunk
 
         # Send file as attachment
-        response = make_response(content)
-        response.headers['Content-Disposition'] = f'attachment; filename={filename}'
-        response.mimetype = 'text/csv'
+        response = app.response_class(generate(), status=status, mimetype=blob.content_type or 'text/csv', headers=headers)
+        response.headers['Content-Length'] = str(stop - start)
+        if status == 206:
+            response.headers['Content-Range'] = f'bytes {start}-{stop - 1}/{size}'
+        response.set_etag(blob.etag)
+        response.last_modified = blob.updated
         return response
 
     except Exception as e:
@@ -475,8 +709,11 @@ def download_results(filename):
 @app.route('/api/get_flagged_addresses', methods=['GET'])
 def get_flagged_addresses():
     try:
-        with open(FLAGGED_JSON_PATH, 'r') as f:
-            flagged_addresses = json.load(f)
+        flagged_addresses = address_index_loader.get().flagged_addresses
+        if flagged_addresses is None:
+            # The index answers lookups from the compiled table; read the lists themselves
+            with open(FLAGGED_JSON_PATH, 'r') as f:
+                flagged_addresses = json.load(f)
         return jsonify(flagged_addresses)
     except Exception as e:
         logger.error(f"Error loading flagged addresses: {e}")
@@ -488,12 +725,17 @@ def get_upload_history():
     if not uid:
         return jsonify({'error': 'UID required'}), 400
 
+    # Newest entries first page by page; pass next_before back as before for older ones
+    limit = request.args.get('limit', UPLOAD_HISTORY_PAGE_SIZE, type=int)
+    limit = max(1, min(limit, UPLOAD_HISTORY_MAX_PAGE_SIZE))
+    before = request.args.get('before') or None
+
     history_ref = db.reference(f'users/{uid}/upload_history')
-    history = history_ref.get()
-    if history:
-        return jsonify({'history': list(history.values())}), 200
-    else:
-        return jsonify({'history': []}), 200
+    items, has_more = rtdb_cache.get_page(history_ref, limit, before)
+    return jsonify({
+        'history': [entry for _, entry in items],
+        'next_before': items[0][0] if has_more and items else None
+    }), 200
 
 
 @app.route('/api/monitor_address', methods=['POST'])
@@ -516,16 +758,7 @@ def monitor_address():
 
 def get_transaction_history(address):
     try:
-        url = f'https://api.etherscan.io/api?module=account&action=txlist&address={address}&sort=asc&apikey={ETHERSCAN_API_KEY}'
-        response = requests.get(url)
-        if response.status_code != 200:
-            raise Exception(f"Error fetching data from Etherscan API: {response.status_code}")
-
-        data = response.json()
-        if data['status'] != '1':
-            raise Exception(f"No transactions found: {data['message']}")
-
-        transactions = data['result']
+        transactions = history_cache.get('txlist', address)
         formatted_transactions = [{
             'hash': tx['hash'],
             'from': tx['from'],
@@ -540,46 +773,10 @@ def get_transaction_history(address):
         app.logger.error(f"Error fetching transaction history: {e}")
         return []
 
-def check_dusting_patterns(wallet_address):
-    # Placeholder function for checking dusting patterns
-    dusting_patterns = []
-    
-    try:
-        # Fetch the wallet's transactions from Etherscan API
-        url = f'https://api.etherscan.io/api?module=account&action=txlist&address={wallet_address}&sort=asc&apikey={ETHERSCAN_API_KEY}'
-        response = requests.get(url)
-        if response.status_code != 200:
-            return dusting_patterns
-
-        data = response.json()
-        if data['status'] != '1':
-            return dusting_patterns
-
-        transactions = data['result']
-        
-        # Analyze transactions for dusting behavior
-        for tx in transactions:
-            value_eth = int(tx['value']) / 1e18  # Convert from Wei to Ether
-            # Consider dust transactions as those with very small amounts, e.g., less than 0.001 ETH
-            if value_eth > 0 and value_eth < 0.001:
-                dusting_patterns.append({
-                    'transactionHash': tx['hash'],
-                    'from': tx['from'],
-                    'to': tx['to'],
-                    'value': value_eth,
-                    'timestamp': datetime.datetime.fromtimestamp(int(tx['timeStamp'])).isoformat()
-                })
-
-    except Exception as e:
-        logger.error(f"Error fetching transaction history: {e}")
-
-    return dusting_patterns
-
-
 # Function to provide recommendations based on dusting patterns
-def provide_dusting_recommendations(dusting_patterns):
+def provide_dusting_recommendations(dusting_patterns, token_dusting=None):
     recommendations = []
-    if dusting_patterns:
+    if dusting_patterns or (token_dusting and token_dusting['received_dust_transfers']):
         recommendations.append("Your wallet has been dusted. It's recommended to not interact with these dust transactions.")
         recommendations.append("Consider using a different wallet address for your transactions.")
         recommendations.append("Monitor your wallet closely for any unauthorized transactions.")
@@ -587,29 +784,57 @@ def provide_dusting_recommendations(dusting_patterns):
         recommendations.append("No dusting patterns detected. Your wallet appears to be safe.")
     return recommendations
 
+# Detectors always reported by /api/dustcheck
+DUSTCHECK_DETECTORS = ('dusting_patterns', 'token_dusting')
+
 @app.route('/api/dustcheck', methods=['GET'])
 def dust_check_endpoint():
     address = request.args.get('address')
     if not address:
         return jsonify({'error': 'Address parameter is required'}), 400
 
-    # Load unique addresses and flagged addresses
-    unique_addresses = load_unique_addresses()
-    flagged_addresses = load_flagged_addresses()
+    # Optional extra detectors, e.g. ?detectors=dusting_risk,targeted_risk
+    extra_detectors = [
+        name for name in dict.fromkeys(request.args.get('detectors', '').split(','))
+        if name and name not in DUSTCHECK_DETECTORS
+    ]
+    unknown = [name for name in extra_detectors if name not in DETECTORS]
+    if unknown:
+        return jsonify({'error': f"Unknown detectors: {', '.join(unknown)}"}), 400
+
+    # Get the shared sanctions/mixer index
+    address_index = address_index_loader.get()
 
-    description = check_wallet_address(address, unique_addresses, flagged_addresses)
-    if 'Flagged' in description:
-        description += get_etherscan_details(address, unique_addresses)
+    description = check_wallet_address(address, address_index)
+
+    # One fetch and one pass over the history feed every detector
+    dusting_patterns = []
+    token_dusting = None
+    detections = {}
+    try:
+        details, detections = scan_wallet_history(
+            address, address_index, [*DUSTCHECK_DETECTORS, *extra_detectors]
+        )
+        dusting_patterns = detections.pop('dusting_patterns')
+        token_dusting = detections.pop('token_dusting')
+        if 'Flagged' in description:
+            description += format_etherscan_details(details)
+    except Exception as e:
+        logger.error(f"Error fetching data from Etherscan API: {e}")
+        if 'Flagged' in description:
+            description += "Error retrieving transaction details."
 
-    dusting_patterns = check_dusting_patterns(address)
-    recommendations = provide_dusting_recommendations(dusting_patterns)
+    recommendations = provide_dusting_recommendations(dusting_patterns, token_dusting)
 
     response_data = {
         'address': address,
         'description': description,
         'dusting_patterns': dusting_patterns,
+        'token_dusting': token_dusting,
         'recommendations': recommendations
     }
+    if extra_detectors:
+        response_data['detections'] = detections
 
     return jsonify(response_data)
 
@@ -628,24 +853,14 @@ def analyze_smart_contract():
             # Read the smart contract code
             contract_code = file.read().decode('utf-8')
 
-            # Call the AI service to analyze the smart contract
-            ai_service_url = 'https://api.openai.com/v1/chat/completions'
-            payload = {
-                'model': 'gpt-3.5-turbo-0125',
-                'messages': [{'role': 'system', 'content': f"Analyze the following Solidity smart contract: {contract_code}"}]
-            }
-            headers = {
-                'Content-Type': 'application/json',
-                'Authorization': f'Bearer {OPENAI_API_KEY}'
-            }
-
-            response = requests.post(ai_service_url, json=payload, headers=headers)
-
-            if response.status_code != 200:
+            # Analyze with GenAI, chunked for large files and cached by normalized source hash
+            try:
+                analysis, source_hash, cached = contract_analyzer.analyze(contract_code)
+            except (GenAIError, requests.exceptions.RequestException) as e:
+                logger.error(f"Error analyzing smart contract: {e}")
                 return jsonify({'error': 'Failed to analyze smart contract'}), 500
 
-            analysis_result = response.json()
-            return jsonify({'analysis': analysis_result})
+            return jsonify({'analysis': analysis, 'source_hash': source_hash, 'cached': cached})
 
         except Exception as e:
             return jsonify({'error': str(e)}), 500
@@ -654,70 +869,67 @@ def analyze_smart_contract():
 
 # Utility functions
 def fetch_transactions(address):
-    url = f'https://api.etherscan.io/api?module=account&action=txlist&address={address}&startblock=0&endblock=99999999&sort=asc&apikey={ETHERSCAN_API_KEY}'
-    response = requests.get(url)
-    data = response.json()
-    return data['result'] if data['status'] == '1' else []
+    return history_cache.get('txlist', address)
 
 def fetch_internal_transactions(address):
-    url = f'https://api.etherscan.io/api?module=account&action=txlistinternal&address={address}&startblock=0&endblock=99999999&sort=asc&apikey={ETHERSCAN_API_KEY}'
-    response = requests.get(url)
-    data = response.json()
-    return data['result'] if data['status'] == '1' else []
+    return history_cache.get('txlistinternal', address)
 
 def fetch_token_transfers(address):
-    url = f'https://api.etherscan.io/api?module=account&action=tokentx&address={address}&startblock=0&endblock=99999999&sort=asc&apikey={ETHERSCAN_API_KEY}'
-    response = requests.get(url)
-    data = response.json()
-    return data['result'] if data['status'] == '1' else []
+    return history_cache.get('tokentx', address)
 
 def calculate_metrics(address, transactions, token_transfers):
+    return calculate_metrics_from_pages(address, [transactions], [token_transfers])
+
+# Function to accumulate the wallet metrics over pages of history as they arrive
+def calculate_metrics_from_pages(address, transaction_pages, token_transfer_pages):
     metrics = {}
-    eth_sent = sum(float(tx['value']) for tx in transactions if tx['from'].lower() == address.lower())
-    eth_received = sum(float(tx['value']) for tx in transactions if tx['to'].lower() == address.lower())
-    avg_gas_price = sum(float(tx['gasPrice']) for tx in transactions) / len(transactions)
-    
+    eth_sent = eth_received = total_gas_price = 0.0
+    transaction_count = 0
+    for transactions in transaction_pages:
+        tx_frame = TransactionFrame(transactions, address)
+        eth_sent += float(tx_frame.values[tx_frame.sent_mask(case_sensitive=False)].sum())
+        eth_received += float(tx_frame.values[tx_frame.received_mask(case_sensitive=False)].sum())
+        total_gas_price += float(tx_frame.column('gasPrice').sum())
+        transaction_count += len(tx_frame)
+    avg_gas_price = total_gas_price / transaction_count
+
+    token_counts = Counter()
+    for token_transfers in token_transfer_pages:
+        token_counts.update(value_counts(TransactionFrame(token_transfers).column('tokenSymbol')))
+
     metrics['Total ETH Sent'] = eth_sent / 1e18
     metrics['Total ETH Received'] = eth_received / 1e18
     metrics['Average Gas Price (Gwei)'] = avg_gas_price / 1e9
     
-    token_counts = {}
-    for tx in token_transfers:
-        token_symbol = tx['tokenSymbol']
-        if token_symbol not in token_counts:
-            token_counts[token_symbol] = 0
-        token_counts[token_symbol] += 1
-    
-    metrics['Token Transfers'] = token_counts
+    metrics['Token Transfers'] = dict(sorted(token_counts.items()))
     return metrics
 
-def calculate_capital_gains(address, transactions):
-    purchase_history = []
-    capital_gains = 0.0
-    for tx in transactions:
-        if tx['to'].lower() == address.lower():
-            purchase_history.append({
-                'date': datetime.datetime.fromtimestamp(int(tx['timeStamp'])),
-                'amount': float(tx['value']) / 1e18,
-                'price': 2000.0  # Example purchase price, replace with real-time price
-            })
-        elif tx['from'].lower() == address.lower():
-            sale_amount = float(tx['value']) / 1e18
-            sale_price = 3000.0  # Example sale price, replace with real-time price
-            for purchase in purchase_history:
-                if sale_amount == 0:
-                    break
-                if purchase['amount'] <= sale_amount:
-                    gain = (sale_price - purchase['price']) * purchase['amount']
-                    capital_gains += gain
-                    sale_amount -= purchase['amount']
-                    purchase_history.remove(purchase)
-                else:
-                    gain = (sale_price - purchase['price']) * sale_amount
-                    capital_gains += gain
-                    purchase['amount'] -= sale_amount
-                    sale_amount = 0
-    return capital_gains
+# Function to turn a looked-up price into an exact Decimal, or the example price
+# when the local price history does not cover that date
+def price_or_default(price, default):
+    return Decimal(default) if np.isnan(price) else Decimal(repr(float(price)))
+
+# Function to match a wallet's ETH sales against its purchases lot by lot, in exact wei
+def calculate_realized_gains(address, transactions, method=FIFO):
+    ledger = LotLedger(method)
+    address_lower = address.lower()
+    timestamps = [int(tx['timeStamp']) for tx in transactions]
+    # Historical ETH prices for the whole history in one batch lookup
+    eth_prices = price_store.prices_at('ETH', timestamps)
+    realized_gains = []
+    for tx, timestamp, eth_price in zip(transactions, timestamps, eth_prices):
+        if tx['to'].lower() == address_lower:
+            purchase_price = price_or_default(eth_price, 2000)
+            ledger.buy(to_wei(tx['value']), purchase_price, timestamp, tx.get('hash'))
+        elif tx['from'].lower() == address_lower:
+            sale_price = price_or_default(eth_price, 3000)
+            lots, _ = ledger.sell(to_wei(tx['value']), sale_price, timestamp, tx.get('hash'))
+            realized_gains.extend(lots)
+    return realized_gains
+
+def calculate_capital_gains(address, transactions, method=FIFO):
+    realized_gains = calculate_realized_gains(address, transactions, method)
+    return float(sum((lot['gain'] for lot in realized_gains), Decimal(0)))
 
 def process_data(address, transactions, internal_transactions, token_transfers):
     metrics = calculate_metrics(address, transactions, token_transfers)
@@ -726,8 +938,10 @@ def process_data(address, transactions, internal_transactions, token_transfers):
     store_data(address, transactions, metrics, capital_gains)
 
 def store_data(address, transactions, metrics, capital_gains):
-    # Implement storage logic, e.g., save to a database or update a cache
-    pass
+    # The histories themselves were persisted by the read-through store when
+    # they were fetched; only the derived figures are saved here
+    if tx_store is not None:
+        tx_store.save_metrics(address, metrics, capital_gains)
 
 @app.route('/api/get_data_and_metrics', methods=['GET'])
 def get_data_and_metrics():
@@ -735,18 +949,23 @@ def get_data_and_metrics():
         address = request.args.get('address')
         if not address:
             return jsonify({'error': 'Address parameter is required'}), 400
+        gains_method = request.args.get('gains_method', FIFO).lower()
+        if gains_method not in MATCHING_METHODS:
+            return jsonify({'error': f'gains_method must be one of {", ".join(MATCHING_METHODS)}'}), 400
+
+        transactions, internal_transactions, token_transfers = fetch_concurrently(
+            (fetch_transactions, address),
+            (fetch_internal_transactions, address),
+            (fetch_token_transfers, address)
+        )
 
-        transactions = fetch_transactions(address)
-        internal_transactions = fetch_internal_transactions(address)
-        token_transfers = fetch_token_transfers(address)
-        
         if not transactions:
             return jsonify({'error': 'No transactions found'}), 404
         
         metrics = calculate_metrics(address, transactions, token_transfers)
-        capital_gains = calculate_capital_gains(address, transactions)
+        realized_gains = calculate_realized_gains(address, transactions, gains_method)
         
-        metrics['Capital Gains'] = capital_gains
+        metrics['Capital Gains'] = float(sum((lot['gain'] for lot in realized_gains), Decimal(0)))
 
         transformed_data = {
             'address': address,
@@ -758,7 +977,8 @@ def get_data_and_metrics():
         return jsonify({
             'raw_data': transactions,
             'transformed_data': transformed_data,
-            'metrics': metrics
+            'metrics': metrics,
+            'realized_gains': [serialize_realized_gain(lot) for lot in realized_gains]
         })
 
     except requests.exceptions.RequestException as e:
@@ -777,14 +997,13 @@ def analyze_transactions_endpoint():
         if not address:
             return jsonify({'error': 'Address parameter is required'}), 400
 
-        transactions = fetch_transactions(address)
-        if not transactions:
+        pages = iter_transaction_pages(address)
+        if pages is None:
             return jsonify({'error': 'No transactions found'}), 404
 
-        unique_addresses = load_unique_addresses()
-        flagged_addresses = load_flagged_addresses()
+        address_index = address_index_loader.get()
 
-        summary = analyze_transactions_with_flagged_addresses(transactions, unique_addresses, flagged_addresses)
+        summary = analyze_transaction_pages(pages, address_index)
 
         return jsonify(summary)
     except Exception as e:
@@ -831,87 +1050,89 @@ def analyze_with_ai(transactions):
         logger.error(f"Error analyzing with AI: {e}")
         return "Failed to analyze transactions with AI"
 
-def calculate_activity_score(data):
-    transaction_count = len(data['transactions'])
-    transaction_value_sum = sum(float(tx['value']) for tx in data['transactions'])
+# Score functions below work on a TransactionFrame built once per request, so the
+# transaction list is parsed a single time and every score is a vectorized expression
+def calculate_activity_score(tx_frame):
+    transaction_count = len(tx_frame)
+    transaction_value_sum = float(tx_frame.values.sum())
     activity_score = min(100, transaction_count + transaction_value_sum / 10)
     return activity_score
 
-def calculate_risk_scores(data):
+def calculate_risk_scores(tx_frame):
     return {
-        "targeted_attacks": calculate_targeted_attack_risk(data),
-        "dusting_attacks": calculate_dusting_attack_risk(data),
-        "draining": calculate_draining_risk(data),
-        "phishing": calculate_phishing_risk(data)
+        "targeted_attacks": calculate_targeted_attack_risk(tx_frame),
+        "dusting_attacks": calculate_dusting_attack_risk(tx_frame),
+        "draining": calculate_draining_risk(tx_frame),
+        "phishing": calculate_phishing_risk(tx_frame)
     }
 
-def calculate_targeted_attack_risk(data):
-    high_value_tx = sum(1 for tx in data['transactions'] if float(tx['value']) > 1)
-    return min(100, high_value_tx * 5)
+def calculate_targeted_attack_risk(tx_frame):
+    return run_frame_detector('targeted_risk', tx_frame)
 
-def calculate_dusting_attack_risk(data):
-    dust_tx = sum(1 for tx in data['transactions'] if float(tx['value']) < 0.0001)
-    return min(100, dust_tx * 10)
+def calculate_dusting_attack_risk(tx_frame):
+    return run_frame_detector('dusting_risk', tx_frame)
 
-def calculate_draining_risk(data):
-    total_outflow = sum(float(tx['value']) for tx in data['transactions'] if tx['from'] == data['address'])
+def calculate_draining_risk(tx_frame):
+    total_outflow = float(tx_frame.values[tx_frame.sent_mask()].sum())
     return min(100, total_outflow / 100)
 
-def calculate_phishing_risk(data):
-    failed_tx = sum(1 for tx in data['transactions'] if tx['status'] == 'Failed')
+def calculate_phishing_risk(tx_frame):
+    failed_tx = int((tx_frame.column('status') == 'Failed').sum())
     return min(100, failed_tx * 10)
 
-def calculate_opportunity_scores(data):
+def calculate_opportunity_scores(tx_frame):
     return {
-        "investment": calculate_investment_opportunity(data),
-        "staking": calculate_staking_opportunity(data),
-        "tax_efficiency": calculate_tax_efficiency(data)
+        "investment": calculate_investment_opportunity(tx_frame),
+        "staking": calculate_staking_opportunity(tx_frame),
+        "tax_efficiency": calculate_tax_efficiency(tx_frame)
     }
 
-def calculate_investment_opportunity(data):
-    incoming_tx_value = sum(float(tx['value']) for tx in data['transactions'] if tx['to'] == data['address'])
+def calculate_investment_opportunity(tx_frame):
+    incoming_tx_value = float(tx_frame.values[tx_frame.received_mask()].sum())
     return min(100, incoming_tx_value / 1000)
 
-def calculate_staking_opportunity(data):
-    unique_stake_tx = len(set(tx['to'] for tx in data['transactions']))
+def calculate_staking_opportunity(tx_frame):
+    unique_stake_tx = tx_frame.column('to').nunique()
     return min(100, unique_stake_tx * 2)
 
-def calculate_tax_efficiency(data):
-    regular_tx = sum(1 for tx in data['transactions'] if tx['description'] == 'Regular transaction')
+def calculate_tax_efficiency(tx_frame):
+    regular_tx = int((tx_frame.column('description') == 'Regular transaction').sum())
     return min(100, regular_tx * 2)
 
-def calculate_trust_scores(data):
+def calculate_trust_scores(tx_frame):
     return {
-        "trusted_sources": calculate_trusted_sources(data),
-        "trusted_recipients": calculate_trusted_recipients(data),
-        "wallet_trust": calculate_wallet_trust(data)
+        "trusted_sources": calculate_trusted_sources(tx_frame),
+        "trusted_recipients": calculate_trusted_recipients(tx_frame),
+        "wallet_trust": calculate_wallet_trust(tx_frame)
     }
 
-def calculate_trusted_sources(data):
-    unique_sources = len(set(tx['from'] for tx in data['transactions'] if tx['to'] == data['address']))
+def calculate_trusted_sources(tx_frame):
+    unique_sources = tx_frame.column('from')[tx_frame.received_mask()].nunique()
     return min(100, unique_sources * 2)
 
-def calculate_trusted_recipients(data):
-    unique_recipients = len(set(tx['to'] for tx in data['transactions'] if tx['from'] == data['address']))
+def calculate_trusted_recipients(tx_frame):
+    unique_recipients = tx_frame.column('to')[tx_frame.sent_mask()].nunique()
     return min(100, unique_recipients * 2)
 
-def calculate_wallet_trust(data):
-    trust_factor = len(data['transactions']) / 10
+def calculate_wallet_trust(tx_frame):
+    trust_factor = len(tx_frame) / 10
     return min(100, trust_factor * 2)
 
-def calculate_volatility_scores(data):
+def calculate_volatility_scores(tx_frame):
     return {
-        "by_coin": calculate_volatility_by_coin(data),
-        "by_wallet": calculate_volatility_by_wallet(data)
+        "by_coin": calculate_volatility_by_coin(tx_frame),
+        "by_wallet": calculate_volatility_by_wallet(tx_frame)
     }
 
-def calculate_volatility_by_coin(data):
-    values = [float(tx['value']) for tx in data['transactions']]
-    return (max(values) - min(values)) / max(values) * 100 if values else 0
+def calculate_volatility_by_coin(tx_frame):
+    if not len(tx_frame):
+        return 0
+    max_value = float(tx_frame.values.max())
+    return (max_value - float(tx_frame.values.min())) / max_value * 100
 
-def calculate_volatility_by_wallet(data):
-    tx_count = len(data['transactions'])
-    tx_value_sum = sum(float(tx['value']) for tx in data['transactions'])
+def calculate_volatility_by_wallet(tx_frame):
+    tx_count = len(tx_frame)
+    tx_value_sum = float(tx_frame.values.sum())
     return min(100, (tx_count / tx_value_sum) * 100 if tx_value_sum else 0)
 
 @app.route('/api/calculate_metrics', methods=['POST'])
@@ -923,11 +1144,12 @@ def calculate_metrics_endpoint():
         return jsonify({"error": "Transformed data is required"}), 400
 
     try:
-        activity_score = calculate_activity_score(transformed_data)
-        risk_scores = calculate_risk_scores(transformed_data)
-        opportunity_scores = calculate_opportunity_scores(transformed_data)
-        trust_scores = calculate_trust_scores(transformed_data)
-        volatility_scores = calculate_volatility_scores(transformed_data)
+        tx_frame = TransactionFrame(transformed_data['transactions'], transformed_data.get('address'))
+        activity_score = calculate_activity_score(tx_frame)
+        risk_scores = calculate_risk_scores(tx_frame)
+        opportunity_scores = calculate_opportunity_scores(tx_frame)
+        trust_scores = calculate_trust_scores(tx_frame)
+        volatility_scores = calculate_volatility_scores(tx_frame)
 
         return jsonify({
             "activity_score": activity_score,